@@ -14,6 +14,8 @@ Released under an MIT license.
 
 
 from .grid import *
+from .batch import generate_many
+from .blocks import split_boundary, generate_blocks
 
 from .tests import test
 
@@ -0,0 +1,263 @@
+# encoding: utf-8
+"""Generation of many grids over a pool of worker processes"""
+
+
+__docformat__ = "restructuredtext en"
+
+
+import multiprocessing
+import pickle
+from multiprocessing.connection import wait
+from concurrent.futures import CancelledError
+from timeit import default_timer
+
+import numpy
+
+from .grid import Gridgen, load_libgridgen
+
+
+class _Worker(object):
+    """
+    A worker process with libgridgen preloaded and shared node buffers.
+
+    Tasks are handed over one at a time through a pipe, so the parent
+    always knows which grid a worker was generating if gridgen-c calls
+    ``exit()`` and takes the process down with it.
+    """
+
+    def __init__(self, context, size):
+        self.xbuf = context.RawArray('d', size)
+        self.ybuf = context.RawArray('d', size)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.xbuf, self.ybuf, load_libgridgen()._name)
+        )
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.index = None
+        self.deadline = None
+
+    def submit(self, index, task, timeout=None):
+        self.index = index
+        if timeout is not None:
+            self.deadline = default_timer() + timeout
+        self.conn.send((index, task))
+
+    def nodes(self, shape):
+        """ Copy the nodes of the last grid out of the shared buffers. """
+        size = shape[0] * shape[1]
+        x = numpy.frombuffer(self.xbuf, count=size).reshape(shape).copy()
+        y = numpy.frombuffer(self.ybuf, count=size).reshape(shape).copy()
+        return x, y
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (IOError, OSError):
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def _worker_main(conn, xbuf, ybuf, path):
+    """ Generate grids received over ``conn`` until told to stop. """
+    # the same library as the parent's
+    load_libgridgen(path)
+    xnodes = numpy.frombuffer(xbuf)
+    ynodes = numpy.frombuffer(ybuf)
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+
+        index, grid = task
+        try:
+            grid = pickle.loads(grid)
+            # daemonic workers cannot start pools of their own, and
+            # the parent is keeping track of the time
+            grid.nprocs = 1
+            grid.timeout = None
+            grid.isolate = False
+            grid.generate_grid()
+            size = grid.nx * grid.ny
+            xnodes[:size] = numpy.ma.filled(grid.x, numpy.nan).ravel()
+            ynodes[:size] = numpy.ma.filled(grid.y, numpy.nan).ravel()
+            conn.send((index, None, (grid.sigmas, grid.xrect, grid.yrect,
+                                     grid.stats)))
+        except Exception as err:
+            conn.send((index, err, None))
+
+    conn.close()
+
+
+def _finish(grid, worker, sigmas, xrect, yrect, stats):
+    """ Populate ``grid`` with the results left by ``worker``. """
+    grid.stats = stats
+    grid.sigmas = sigmas
+    grid._xrect = xrect
+    grid._yrect = yrect
+    grid.nsigmas = sigmas.size
+    if grid.sigma_cache is not None:
+        grid.sigma_cache.put(grid._sigma_key(), sigmas)
+    grid._set_nodes(*worker.nodes(grid.shape))
+    return grid
+
+
+# how often (s) a cancellation token is checked while waiting on workers
+CANCEL_POLL_INTERVAL = 0.01
+
+
+def generate_many(specs, processes=None, timeout=None, cancel=None):
+    """
+    Generate many grids over a pool of worker processes.
+
+    Each worker loads libgridgen once and generates grids one after
+    the other. The nodes are returned through shared memory rather than
+    being pickled. gridgen-c terminates the process on some errors, so a
+    grid whose worker dies is reported as failed and the worker is
+    replaced; the rest of the batch carries on.
+
+    Parameters
+    ----------
+    specs : sequence of dicts or :class:`~pygridgen.Gridgen`
+        The grids to generate. Dictionaries hold the arguments to
+        :class:`~pygridgen.Gridgen` (``xbry``, ``ybry``, ``beta``,
+        ``shape`` and any options); Gridgen objects, e.g. created with
+        ``autogen=False``, are generated as they are.
+    processes : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    timeout : float, optional
+        Maximum time in seconds allowed for each grid. A worker that
+        exceeds it is terminated and replaced, and the grid is reported
+        as a ``TimeoutError``. gridgen-c cannot be interrupted part way
+        through, so no partial solution is available for such grids.
+    cancel : threading.Event, optional
+        Cancellation token. Once it is set, running workers are
+        terminated and all grids not yet generated are reported as
+        ``concurrent.futures.CancelledError``.
+
+    Returns
+    -------
+    grids : list
+        The generated :class:`~pygridgen.Gridgen` objects in the order
+        of ``specs``. Grids that could not be generated are replaced by
+        the exception that was raised (e.g., ``ValueError`` for invalid
+        input, a pickling error for a grid that cannot be sent to a
+        worker, ``RuntimeError`` if gridgen-c exited or
+        ``TimeoutError`` if ``timeout`` was exceeded).
+
+    Examples
+    --------
+    >>> specs = [dict(xbry=x, ybry=y, beta=beta, shape=(n, n))
+    ...          for n in (50, 100, 200)]
+    >>> grids = pygridgen.generate_many(specs, processes=3)
+
+    """
+
+    results = [None] * len(specs)
+    grids = {}
+    pending = []
+    for index, spec in enumerate(specs):
+        try:
+            if isinstance(spec, Gridgen):
+                grid = spec
+            else:
+                options = dict(spec)
+                options['autogen'] = False
+                grid = Gridgen(**options)
+
+            # pickled here, so that a grid that cannot be (e.g., with a
+            # lambda as its focus) fails on its own
+            pending.append((index, pickle.dumps(grid, pickle.HIGHEST_PROTOCOL)))
+            grids[index] = grid
+        except Exception as err:
+            results[index] = err
+
+    if not pending:
+        return results
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    context = multiprocessing.get_context()
+    size = max(grid.nx * grid.ny for grid in grids.values())
+    pending.reverse()
+
+    workers = []
+    try:
+        for _ in range(min(processes, len(pending))):
+            workers.append(_Worker(context, size))
+
+        while pending or any(w.index is not None for w in workers):
+            for worker in workers:
+                if worker.index is None and pending:
+                    worker.submit(*pending.pop(), timeout=timeout)
+
+            busy = [w for w in workers if w.index is not None]
+            remaining = None
+            if timeout is not None:
+                remaining = max(min(w.deadline for w in busy) - default_timer(), 0)
+            if cancel is not None and remaining is None:
+                remaining = CANCEL_POLL_INTERVAL
+            elif cancel is not None:
+                remaining = min(remaining, CANCEL_POLL_INTERVAL)
+            wait([w.conn for w in busy] + [w.process.sentinel for w in busy],
+                 timeout=remaining)
+
+            if cancel is not None and cancel.is_set():
+                for worker in busy:
+                    worker.kill()
+                workers = [w for w in workers if w.index is None]
+                for index in [w.index for w in busy] + [i for i, _ in pending]:
+                    results[index] = CancelledError(
+                        'generation of grid {} was cancelled'.format(index)
+                    )
+                break
+
+            for worker in busy:
+                index = worker.index
+                if worker.conn.poll():
+                    try:
+                        _, err, output = worker.conn.recv()
+                    except (EOFError, IOError, OSError):
+                        worker.process.join()
+                    else:
+                        worker.index = None
+                        if err is None:
+                            results[index] = _finish(grids[index], worker, *output)
+                        else:
+                            results[index] = err
+                        continue
+
+                if not worker.process.is_alive():
+                    # gridgen-c called exit()
+                    worker.process.join()
+                    results[index] = RuntimeError(
+                        'libgridgen terminated the worker process (exit '
+                        'code {}) while generating grid {}'.format(
+                            worker.process.exitcode, index)
+                    )
+                elif timeout is not None and default_timer() >= worker.deadline:
+                    results[index] = TimeoutError(
+                        'grid {} was not generated within {} s'.format(
+                            index, timeout)
+                    )
+                else:
+                    continue
+
+                worker.kill()
+                workers[workers.index(worker)] = _Worker(context, size)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    return results
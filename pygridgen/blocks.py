@@ -0,0 +1,285 @@
+# encoding: utf-8
+"""Generation of grids as a chain of blocks split along cut lines"""
+
+
+__docformat__ = "restructuredtext en"
+
+
+import numpy
+
+from .grid import CGrid, Gridgen
+from .batch import generate_many
+
+
+# number of samples per row of a block grid used to match the nodes of
+# neighbouring blocks along their cut
+CUT_SAMPLING = 4
+
+
+def _chain_order(cuts, nbry):
+    """
+    Validate ``cuts`` and return their endpoints as (a, b) pairs, with
+    all of the ``a`` ends on the same side of the domain.
+    """
+    cuts = [(int(a) % nbry, int(b) % nbry) for a, b in cuts]
+    if not cuts:
+        raise ValueError('at least one cut is required')
+
+    for flip in (False, True):
+        pairs = [(b, a) if flip else (a, b) for a, b in cuts]
+        # indices relative to the first cut, so the boundary may start
+        # anywhere along the chain
+        start = pairs[0][0]
+        a = [(p[0] - start) % nbry for p in pairs]
+        b = [(p[1] - start) % nbry for p in pairs]
+        if (all(a0 < a1 for a0, a1 in zip(a[:-1], a[1:])) and
+                all(b0 > b1 for b0, b1 in zip(b[:-1], b[1:])) and
+                a[-1] + 1 < b[-1] and b[0] + 1 < nbry):
+            return pairs
+
+    raise ValueError('`cuts` must be ordered from one end of the domain to '
+                     'the other, must not cross, and must not connect '
+                     'neighbouring vertices')
+
+
+def split_boundary(xbry, ybry, beta, cuts):
+    """
+    Split a boundary into a chain of blocks along straight cuts.
+
+    Every cut connects two vertices of the boundary (which must have a
+    ``beta`` of 0) and becomes a side of the blocks on either side of
+    it; its endpoints turn into corners (``beta`` of +1) of both.
+
+    Parameters
+    ----------
+    xbry, ybry, beta
+        The boundary, as for :class:`~pygridgen.Gridgen`.
+    cuts : sequence of two-tuples of ints
+        Indices of the vertices joined by each cut, ordered from one
+        end of the domain to the other. The vertices at the first and
+        second positions of the tuples must each lie along the same
+        side of the domain.
+
+    Returns
+    -------
+    blocks : list of tuples (xbry, ybry, beta, ul_idx)
+        The boundaries of the ``len(cuts) + 1`` blocks. ``ul_idx``
+        places the cuts along the first and last columns of the
+        block grids.
+
+    """
+
+    xbry = numpy.asarray(xbry, dtype='d')
+    ybry = numpy.asarray(ybry, dtype='d')
+    beta = numpy.asarray(beta, dtype='d')
+    nbry = len(xbry)
+
+    pairs = _chain_order(cuts, nbry)
+    for index in numpy.ravel(pairs):
+        if beta[index] != 0:
+            raise ValueError('cuts must end at vertices with a beta of 0 '
+                             '(vertex {} has {})'.format(index, beta[index]))
+
+    def walk(first, last):
+        # boundary indices from ``first`` to ``last``, both included
+        return [(first + n) % nbry for n in range((last - first) % nbry + 1)]
+
+    # every block's list ends with its ul_idx vertex: the endpoint of
+    # the cut with the previous block (or the first cut for block 0)
+    rings = [walk(pairs[0][1], pairs[0][0])]
+    for (a0, b0), (a1, b1) in zip(pairs[:-1], pairs[1:]):
+        rings.append(walk(a0, a1) + walk(b1, b0))
+    rings.append(walk(pairs[-1][0], pairs[-1][1]))
+
+    corners = set(numpy.ravel(pairs))
+    blocks = []
+    for n, ring in enumerate(rings):
+        block_beta = numpy.array([1.0 if i in corners else beta[i] for i in ring])
+        if not numpy.isclose(block_beta.sum(), 4.0):
+            raise ValueError('sum of beta of block {} must be 4.0 '
+                             '(got {})'.format(n, block_beta.sum()))
+        blocks.append((xbry[ring], ybry[ring], block_beta, len(ring) - 1))
+
+    return blocks
+
+
+def _merge_edges(left, right):
+    """ Average two copies of a shared column, ignoring NaNs. """
+    merged = 0.5 * (left + right)
+    merged = numpy.where(numpy.isnan(left), right, merged)
+    return numpy.where(numpy.isnan(right), left, merged)
+
+
+def _arclength(x, y):
+    """ Normalized distance along a (straight) cut from its first node. """
+    s = numpy.append(0, numpy.cumsum(numpy.hypot(numpy.diff(x), numpy.diff(y))))
+    return s / s[-1]
+
+
+class _CutFocus(object):
+    """
+    Focus that moves the nodes of a block along its cut(s).
+
+    ``left`` and ``right`` hold the positions along the first and last
+    columns at which the nodes must be placed, sampled at ``eta``; the
+    correction is blended linearly across the block. ``flip`` is set
+    for a block generated turned around. Any other ``focus`` is applied
+    afterwards.
+    """
+
+    def __init__(self, eta, left=None, right=None, flip=False, focus=None):
+        self.eta = eta
+        self.left = left
+        self.right = right
+        self.flip = flip
+        self.focus = focus
+
+    def _side(self, values, eta):
+        if values is None:
+            return eta
+        return numpy.interp(eta, self.eta, values)
+
+    def __call__(self, x, y):
+        xi, eta = (1 - x, 1 - y) if self.flip else (x, y)
+        eta = (1 - xi) * self._side(self.left, eta) + xi * self._side(self.right, eta)
+        y = 1 - eta if self.flip else eta
+        if self.focus is not None:
+            return self.focus(x, y)
+        return x, y
+
+
+def _generate(specs, processes):
+    """ Generate the blocks and return their nodes, cuts as columns. """
+    results = generate_many(specs, processes=processes)
+    for n, result in enumerate(results):
+        if isinstance(result, Exception):
+            raise RuntimeError('block {} could not be generated: '
+                               '{}'.format(n, result))
+
+    nodes = []
+    for n, grid in enumerate(results):
+        x = numpy.ma.filled(grid.x, numpy.nan)
+        y = numpy.ma.filled(grid.y, numpy.nan)
+        if n == 0:
+            # the first block is generated from its only cut; turn it
+            # around so that the cut is its last column
+            x, y = x[::-1, ::-1], y[::-1, ::-1]
+        nodes.append((x, y))
+
+    return results, nodes
+
+
+def _block_nodes(xbry, ybry, beta, cuts, ny, nx, processes=None, **options):
+    """
+    Generate the blocks of :func:`~generate_blocks` without stitching
+    them, and return the nodes of each.
+    """
+
+    blocks = split_boundary(xbry, ybry, beta, cuts)
+    if numpy.ndim(nx) == 0:
+        nx = [nx] * len(blocks)
+    if len(nx) != len(blocks):
+        raise ValueError('`nx` must have one value per block '
+                         '({})'.format(len(blocks)))
+
+    # first pass: solve every block and sample its cuts finely
+    eta = numpy.linspace(0, 1, CUT_SAMPLING * (ny - 1) + 1)
+    specs = [dict(options, xbry=x, ybry=y, beta=b, ul_idx=ul_idx,
+                  shape=(eta.size, 2))
+             for x, y, b, ul_idx in blocks]
+    solved, sides = _generate(specs, processes)
+
+    # place the nodes of both sides of each cut halfway between where
+    # the two blocks would put them on their own
+    left = [None] * len(blocks)
+    right = [None] * len(blocks)
+    for n, ((xl, yl), (xr, yr)) in enumerate(zip(sides[:-1], sides[1:])):
+        sl = _arclength(xl[:, -1], yl[:, -1])
+        sr = _arclength(xr[:, 0], yr[:, 0])
+        target = 0.5 * (sl + sr)
+        right[n] = numpy.interp(target, sl, eta)
+        left[n + 1] = numpy.interp(target, sr, eta)
+
+    # second pass: seeded with the sigmas of the first
+    grids = []
+    for n, ((x, y, b, ul_idx), grid) in enumerate(zip(blocks, solved)):
+        focus = _CutFocus(eta, left[n], right[n], flip=n == 0,
+                          focus=options.get('focus'))
+        spec = dict(options, xbry=x, ybry=y, beta=b, ul_idx=ul_idx,
+                    shape=(ny, nx[n]), focus=focus, autogen=False)
+        block = Gridgen(**spec)
+        block.sigmas = grid.sigmas
+        grids.append(block)
+
+    return _generate(grids, processes)[1]
+
+
+def generate_blocks(xbry, ybry, beta, cuts, ny, nx, processes=None,
+                    **options):
+    """
+    Generate a grid as a chain of blocks split along cut lines.
+
+    For long domains with many side channels, a conformal map of the
+    whole polygon is slow to solve and sensitive to its details. The
+    domain is instead split along ``cuts`` (see
+    :func:`~split_boundary`), each block is generated on its own in a
+    pool of worker processes and the blocks are stitched into a single
+    grid.
+
+    On its own, each block would distribute its nodes along a cut
+    differently. The blocks are therefore solved for first, and then
+    generated again from the same solution with their nodes moved
+    along the cuts to positions halfway between the two distributions
+    (and by a decreasing amount across the rest of the block). The two
+    copies of a cut then agree up to the error of interpolating from
+    ``CUT_SAMPLING`` samples per row spacing, and are averaged. The
+    grid is continuous but not exactly orthogonal across the cuts.
+
+    Parameters
+    ----------
+    xbry, ybry, beta
+        The boundary, as for :class:`~pygridgen.Gridgen`.
+    cuts : sequence of two-tuples of ints
+        Indices of the boundary vertices joined by each cut, ordered
+        from one end of the domain to the other.
+    ny : int
+        Number of nodes along the cuts (rows of the grid).
+    nx : int or sequence of ints
+        Number of nodes across each block, or one value for all of
+        them. Neighbouring blocks share the nodes along their cut.
+    processes : int, optional
+        Number of worker processes, see
+        :func:`~pygridgen.generate_many`.
+    **options
+        Other arguments to :class:`~pygridgen.Gridgen` (e.g.,
+        ``precision`` or ``focus``), used for every block. A ``focus``
+        is applied after the nodes are moved along the cuts.
+
+    Returns
+    -------
+    grid : :class:`~pygridgen.CGrid`
+        The stitched grid, with ``ny`` rows and ``sum(nx) - len(cuts)``
+        columns. The blocks follow each other along the columns in the
+        order of ``cuts``.
+
+    Examples
+    --------
+    >>> grid = pygridgen.generate_blocks(x, y, beta, cuts=[(12, 87), (30, 66)],
+    ...                                  ny=40, nx=[60, 80, 60], processes=3)
+
+    """
+
+    nodes = _block_nodes(xbry, ybry, beta, cuts, ny, nx,
+                         processes=processes, **options)
+
+    x, y = nodes[0]
+    xs, ys = [x[:, :-1]], [y[:, :-1]]
+    for (xl, yl), (xr, yr) in zip(nodes[:-1], nodes[1:]):
+        xs.append(_merge_edges(xl[:, -1:], xr[:, :1]))
+        ys.append(_merge_edges(yl[:, -1:], yr[:, :1]))
+        xs.append(xr[:, 1:-1])
+        ys.append(yr[:, 1:-1])
+    xs.append(nodes[-1][0][:, -1:])
+    ys.append(nodes[-1][1][:, -1:])
+
+    return CGrid(numpy.hstack(xs), numpy.hstack(ys))
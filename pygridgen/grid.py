@@ -8,6 +8,13 @@ __docformat__ = "restructuredtext en"
 import os
 import sys
 import ctypes
+import ctypes.util
+import hashlib
+import pickle
+import threading
+import multiprocessing
+from timeit import default_timer
+from collections import OrderedDict
 
 import numpy
 from matplotlib.path import Path
@@ -18,6 +25,478 @@ def _points_inside_poly(points, verts):
     return [ind for ind, p in enumerate(points) if poly.contains_point(p)]
 
 
+class _NullableNDPointer(object):
+    """
+    Mixin for :func:`numpy.ctypeslib.ndpointer` types that also accept
+    ``None``, which is passed to C as a NULL pointer.
+    """
+
+    @classmethod
+    def from_param(cls, obj):
+        if obj is None:
+            return obj
+        return super(_NullableNDPointer, cls).from_param(obj)
+
+
+# argument types for the arrays handed to libgridgen by pointer
+_double_array = numpy.ctypeslib.ndpointer(dtype=numpy.float64, ndim=1,
+                                          flags='C_CONTIGUOUS')
+_double_array_or_null = type('_double_array_or_null',
+                             (_NullableNDPointer, _double_array), {})
+
+
+# environment variable naming an explicit libgridgen shared library
+LIBGRIDGEN_ENV = 'PYGRIDGEN_LIBGRIDGEN'
+
+# loaded and configured libgridgen handles, keyed by the requested path
+_libgridgen_cache = {}
+
+# explicit path last given to load_libgridgen, used by all later calls
+_libgridgen_path = None
+
+# gridgen-c keeps its state (verbosity, ODE solver flags, ...) in
+# globals and is not reentrant. Calls into it are serialized so that
+# threads cannot corrupt that state; this does not make them concurrent
+_libgridgen_lock = threading.RLock()
+
+
+# default names/locations searched for the gridgen-c shared library
+_libgridgen_paths = [
+    ('libgridgen.so', os.path.join(sys.prefix, 'lib')),
+    ('libgridgen', os.path.join(sys.prefix, 'lib')),
+    ('libgridgen.so', '/usr/local/lib'),
+    ('libgridgen', '/usr/local/lib'),
+]
+
+
+def _configure_libgridgen(lib):
+    """ Declare the prototypes of the libgridgen functions we use. """
+    lib.gridgen_generategrid2.argtypes = [
+        ctypes.c_int,                               # nbdry
+        _double_array,                              # xbdry
+        _double_array,                              # ybdry
+        _double_array,                              # beta
+        ctypes.c_int,                               # ul
+        ctypes.c_int,                               # nx
+        ctypes.c_int,                               # ny
+        ctypes.c_int,                               # ngrid
+        _double_array_or_null,                      # xgrid
+        _double_array_or_null,                      # ygrid
+        ctypes.c_int,                               # nnodes
+        ctypes.c_int,                               # newton
+        ctypes.c_double,                            # precision
+        ctypes.c_int,                               # checksimplepoly
+        ctypes.c_int,                               # thin
+        ctypes.c_int,                               # nppe
+        ctypes.c_int,                               # verbose
+        ctypes.POINTER(ctypes.c_int),               # nsigmas
+        ctypes.POINTER(ctypes.POINTER(ctypes.c_double)),  # sigmas
+        ctypes.POINTER(ctypes.c_int),               # nrect
+        ctypes.POINTER(ctypes.POINTER(ctypes.c_double)),  # xrect
+        ctypes.POINTER(ctypes.POINTER(ctypes.c_double)),  # yrect
+    ]
+    lib.gridgen_generategrid2.restype = ctypes.c_void_p
+    lib.gridnodes_getx.argtypes = [ctypes.c_void_p]
+    lib.gridnodes_getx.restype = ctypes.POINTER(ctypes.POINTER(ctypes.c_double))
+    lib.gridnodes_gety.argtypes = [ctypes.c_void_p]
+    lib.gridnodes_gety.restype = ctypes.POINTER(ctypes.POINTER(ctypes.c_double))
+    lib.gridnodes_getnce1.argtypes = [ctypes.c_void_p]
+    lib.gridnodes_getnce1.restype = ctypes.c_int
+    lib.gridnodes_getnce2.argtypes = [ctypes.c_void_p]
+    lib.gridnodes_getnce2.restype = ctypes.c_int
+    lib.gridnodes_destroy.argtypes = [ctypes.c_void_p]
+    lib.gridnodes_destroy.restype = None
+    lib.gridmap_build.restype = ctypes.c_void_p
+
+    return lib
+
+
+def load_libgridgen(path=None):
+    """
+    Load the gridgen-c shared library.
+
+    The library is located and its function prototypes are declared
+    only once per process; subsequent calls return the cached handle.
+    This keeps the construction of many :class:`~Gridgen` objects (and
+    the start up of worker processes) cheap.
+
+    Parameters
+    ----------
+    path : str, optional
+        Explicit path to the shared library. Once it has been loaded,
+        it becomes the library used by everything else in the process
+        (:class:`~Gridgen`, :class:`~ConformalMap` and their worker
+        processes). If not given, the last explicit path is used,
+        then the path in the ``PYGRIDGEN_LIBGRIDGEN`` environment
+        variable and, failing that, ``libgridgen`` is searched for in
+        ``sys.prefix/lib`` and ``/usr/local/lib``.
+
+    Returns
+    -------
+    lib : ctypes.CDLL
+        The configured library handle.
+
+    """
+
+    global _libgridgen_path
+    explicit = path is not None
+    if path is None:
+        path = _libgridgen_path or os.environ.get(LIBGRIDGEN_ENV) or None
+
+    if path in _libgridgen_cache:
+        if explicit:
+            _libgridgen_path = path
+        return _libgridgen_cache[path]
+
+    if path is not None:
+        paths = [(os.path.basename(path), os.path.dirname(path) or '.')]
+    else:
+        paths = _libgridgen_paths
+
+    for name, libdir in paths:
+        try:
+            lib = numpy.ctypeslib.load_library(name, libdir)
+            break
+        except OSError:
+            pass
+    else:
+        raise OSError('Failed to load libgridgen. Attempted '
+                      'names/locations: {}'.format(paths))
+
+    _libgridgen_cache[path] = _configure_libgridgen(lib)
+    if explicit:
+        _libgridgen_path = path
+    return _libgridgen_cache[path]
+
+
+# the C library's ``malloc`` and ``free``, loaded on first use
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'msvcrt')
+        libc.malloc.argtypes = [ctypes.c_size_t]
+        libc.malloc.restype = ctypes.c_void_p
+        libc.free.argtypes = [ctypes.c_void_p]
+        libc.free.restype = None
+        _libc = libc
+    return _libc
+
+
+def _malloc_copy(array):
+    """
+    Copy ``array`` into a buffer allocated with C ``malloc``.
+
+    gridgen-c takes ownership of the initial sigmas it is given: it
+    frees them and hands back a new buffer with the solution. Passing
+    memory owned by numpy would have it freed twice.
+    """
+    array = numpy.ascontiguousarray(array, dtype=numpy.float64)
+    pointer = _load_libc().malloc(max(array.nbytes, 1))
+    if not pointer:
+        raise MemoryError('could not allocate {} bytes'.format(array.nbytes))
+    ctypes.memmove(pointer, array.ctypes.data, array.nbytes)
+    return ctypes.cast(pointer, ctypes.POINTER(ctypes.c_double))
+
+
+def _free(pointer):
+    """
+    Release a buffer that gridgen-c allocated with ``malloc`` and
+    handed over to the caller. NULL pointers are ignored.
+    """
+    if pointer:
+        _load_libc().free(ctypes.cast(pointer, ctypes.c_void_p))
+
+
+def _nodes_as_array(nodes, shape):
+    """
+    Copy a gridnodes coordinate array out of libgridgen.
+
+    The ``double **`` returned by ``gridnodes_getx``/``gridnodes_gety``
+    points at row pointers into a single contiguous block (see
+    ``alloc2d`` in gridgen-c), so the whole grid is copied with one
+    memcpy rather than element by element.
+
+    Parameters
+    ----------
+    nodes : ctypes.POINTER(ctypes.POINTER(ctypes.c_double))
+        The row pointers returned by libgridgen.
+    shape : two-tuple of ints (ny, nx)
+        The number of nodes in each direction.
+
+    Returns
+    -------
+    array : numpy.ndarray
+        A C-contiguous copy of the node coordinates that does not
+        depend on the lifetime of the gridnodes object.
+
+    """
+
+    return numpy.ctypeslib.as_array(nodes[0], shape=shape).copy()
+
+
+def _normalize_boundary(xbry, ybry):
+    """
+    Translate and scale a boundary into the unit box.
+
+    A single scale factor (the larger of the two extents) is used, so
+    angles -- and with them the conformal map -- are unchanged, while
+    gridgen-c's tolerances become relative to the size of the domain.
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+        The normalized boundary.
+    transform : three-tuple of floats (x0, y0, scale)
+        Maps normalized coordinates back, see :func:`~_denormalize`.
+
+    """
+    xbry = numpy.asarray(xbry, dtype=numpy.float64)
+    ybry = numpy.asarray(ybry, dtype=numpy.float64)
+    x0, y0 = xbry.min(), ybry.min()
+    scale = max(xbry.max() - x0, ybry.max() - y0)
+    if not scale > 0:
+        scale = 1.0
+    return (xbry - x0) / scale, (ybry - y0) / scale, (x0, y0, scale)
+
+
+def _denormalize(x, y, transform):
+    """ Map nodes of a normalized boundary back to its coordinates. """
+    x0, y0, scale = transform
+    return x * scale + x0, y * scale + y0
+
+
+def _newton_flag(newton):
+    """
+    Translate the ``newton`` option into gridgen-c's integer flag.
+
+    Only 0 (simple iterations) and 1 (Gauss-Newton with a Broyden
+    update) are accepted. gridgen-c treats larger values as a request
+    for its limited-memory update, which is not usable: the dense update
+    is still applied to the smaller buffers allocated for it.
+
+    """
+
+    if newton not in (0, 1):
+        raise ValueError('`newton` must be True or False')
+    return int(newton)
+
+
+def _generategrid2(lib, xbry, ybry, beta, ul_idx, shape, xgrid=None,
+                   ygrid=None, nnodes=14, newton=True, precision=1.0e-12,
+                   checksimplepoly=True, thin=True, nppe=3, verbose=False,
+                   sigmas=None):
+    """
+    Thin wrapper around ``gridgen_generategrid2``.
+
+    Parameters
+    ----------
+    lib : ctypes.CDLL
+        Handle returned by :func:`~load_libgridgen`.
+    xbry, ybry, beta, ul_idx
+        The boundary, as for :class:`~Gridgen`.
+    shape : two-tuple of ints (ny, nx)
+        Number of nodes to generate.
+    xgrid, ygrid : numpy.ndarray, optional
+        Normalized (in [0, 1]) positions of the ``ny * nx`` nodes in
+        C-order. A uniform grid is generated when omitted.
+    nnodes, newton, precision, checksimplepoly, thin, nppe, verbose
+        Options passed through to gridgen-c.
+    sigmas : numpy.ndarray, optional
+        Initial guess for the sigmas.
+
+    Returns
+    -------
+    gn : int
+        Pointer to the gridnodes object, owned by the caller.
+    sigmas : numpy.ndarray
+        The converged sigmas.
+    xrect, yrect : numpy.ndarray
+        The image of the corners (the boundary vertices with a non-zero
+        beta) in the canonical rectangle.
+
+    """
+
+    ny, nx = shape
+    if sigmas is None:
+        nsigmas = ctypes.c_int(0)
+        sigmas_p = ctypes.POINTER(ctypes.c_double)()
+    else:
+        nsigmas = ctypes.c_int(numpy.size(sigmas))
+        sigmas_p = _malloc_copy(sigmas)
+
+    nrect = ctypes.c_int(0)
+    xrect = ctypes.POINTER(ctypes.c_double)()
+    yrect = ctypes.POINTER(ctypes.c_double)()
+
+    if xgrid is None:
+        ngrid = 0
+    else:
+        xgrid = numpy.ascontiguousarray(xgrid, dtype=numpy.float64).ravel()
+        ygrid = numpy.ascontiguousarray(ygrid, dtype=numpy.float64).ravel()
+        ngrid = xgrid.size
+
+    with _libgridgen_lock:
+        gn = lib.gridgen_generategrid2(
+            len(xbry),
+            numpy.ascontiguousarray(xbry, dtype=numpy.float64),
+            numpy.ascontiguousarray(ybry, dtype=numpy.float64),
+            numpy.ascontiguousarray(beta, dtype=numpy.float64),
+            ul_idx,
+            nx,
+            ny,
+            ngrid,
+            xgrid,
+            ygrid,
+            nnodes,
+            _newton_flag(newton),
+            precision,
+            checksimplepoly,
+            thin,
+            nppe,
+            verbose,
+            ctypes.byref(nsigmas),
+            ctypes.byref(sigmas_p),
+            ctypes.byref(nrect),
+            ctypes.byref(xrect),
+            ctypes.byref(yrect)
+        )
+
+    # copy everything gridgen-c allocated for us and release it straight
+    # away; only the gridnodes object is left for the caller to destroy.
+    # The sigmas are always gridgen-c's own: it frees any initial guess
+    # and replaces it with the solution
+    buffers = [xrect, yrect, sigmas_p]
+
+    try:
+        sigmas = numpy.ctypeslib.as_array(sigmas_p, shape=(nsigmas.value,)).copy()
+        if nrect.value > 0:
+            xrect = numpy.ctypeslib.as_array(xrect, shape=(nrect.value,)).copy()
+            yrect = numpy.ctypeslib.as_array(yrect, shape=(nrect.value,)).copy()
+        else:
+            xrect = numpy.empty(0)
+            yrect = numpy.empty(0)
+    finally:
+        for pointer in buffers:
+            _free(pointer)
+
+    return gn, sigmas, xrect, yrect
+
+
+# precision and number of quadrature nodes of the preliminary solve
+# made with ``continuation``
+CONTINUATION_PRECISION = 1.0e-4
+CONTINUATION_NNODES = 5
+
+
+def _continuation_sigmas(lib, xbry, ybry, beta, ul_idx, nnodes=14,
+                         precision=1.0e-12, **options):
+    """
+    Solve for the sigmas to a loose precision with few quadrature nodes.
+
+    Iterations of this solve are much cheaper than at full precision,
+    and the result is a far better initial guess for the final solve
+    than gridgen-c's own. The sigmas belong to the quadrilaterals of
+    the triangulated boundary, so the same (not a decimated) boundary
+    has to be used for both solves.
+    """
+    gn, sigmas, _, _ = _generategrid2(
+        lib, xbry, ybry, beta, ul_idx, (2, 2),
+        nnodes=min(nnodes, CONTINUATION_NNODES),
+        precision=max(precision, CONTINUATION_PRECISION), **options
+    )
+    lib.gridnodes_destroy(gn)
+    return sigmas
+
+
+# number of nodes per interval of the exactly mapped lattice used by
+# ConformalMap.map_interpolated
+INTERPOLATION_STRIDE = 8
+
+
+def _lagrange_weights(t, m):
+    """
+    Weights of four-point (cubic) Lagrange interpolation from a uniform
+    lattice of ``m`` points over [0, 1].
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        Positions in [0, 1] to interpolate to.
+    m : int
+        Number of lattice points, at least 4.
+
+    Returns
+    -------
+    weights : numpy.ndarray
+        ``(t.size, m)`` matrix; each row has (at most) four non-zeros.
+    stencil : numpy.ndarray of bools
+        The lattice points used for each position.
+    cell : numpy.ndarray of ints
+        The lattice interval that each position falls into.
+
+    """
+    s = t * (m - 1)
+    cell = numpy.minimum(s.astype(int), m - 2)
+    start = numpy.clip(cell - 1, 0, m - 4)
+    s = s - start
+
+    rows = numpy.arange(t.size)
+    weights = numpy.zeros((t.size, m))
+    stencil = numpy.zeros((t.size, m), dtype=bool)
+    for k in range(4):
+        w = numpy.ones(t.size)
+        for l in range(4):
+            if l != k:
+                w *= (s - l) / (k - l)
+        weights[rows, start + k] = w
+        stencil[rows, start + k] = True
+    return weights, stencil, cell
+
+
+def _morton_order(x, y, bits=16):
+    """
+    Indices that sort points in the unit square along a Z-order curve.
+
+    Consecutive points in this order are (mostly) spatial neighbours,
+    which keeps the last-quadrilateral hint used by gridgen-c when
+    locating points effective for scattered input. Without a hit,
+    gridgen-c's ``z2q`` falls back to a linear scan over all of the
+    quadrilaterals. That scan lives in the libgridgen that pygridgen
+    loads prebuilt (from conda or a separate gridgen-c build), so the
+    order of the input is what can be improved from here.
+
+    Parameters
+    ----------
+    x, y : numpy.ndarray
+        One dimensional arrays of positions within [0, 1].
+    bits : int, optional (default = 16)
+        Resolution of the curve in each direction.
+
+    Returns
+    -------
+    order : numpy.ndarray of ints
+
+    """
+
+    def spread(v):
+        # insert a zero bit between each of the lower 16 bits
+        v = v & 0x0000ffff
+        v = (v | (v << 8)) & 0x00ff00ff
+        v = (v | (v << 4)) & 0x0f0f0f0f
+        v = (v | (v << 2)) & 0x33333333
+        v = (v | (v << 1)) & 0x55555555
+        return v
+
+    scale = (1 << bits) - 1
+    ix = numpy.clip(numpy.asarray(x) * scale, 0, scale).astype(numpy.uint64)
+    iy = numpy.clip(numpy.asarray(y) * scale, 0, scale).astype(numpy.uint64)
+    return numpy.argsort(spread(ix) | (spread(iy) << numpy.uint64(1)),
+                         kind='mergesort')
+
+
 def _approximate_erf(x):
     """
     Approximate solution to error function.
@@ -194,6 +673,30 @@ class Focus(object):
             x, y = focuspoint(x, y)
         return x, y
 
+    def vectors(self, nx, ny):
+        """
+        Focused positions of the columns and rows of a uniform grid.
+
+        Each focus point only moves coordinates along its own axis, so
+        the focused grid is the tensor product of the two vectors
+        returned here. This is much cheaper than focusing a full
+        ``nx * ny`` grid.
+
+        Parameters
+        ----------
+        nx, ny : int
+            The number of columns and rows of the grid.
+
+        Returns
+        -------
+        x : numpy.ndarray
+            The ``nx`` focused positions along the x-axis.
+        y : numpy.ndarray
+            The ``ny`` focused positions along the y-axis.
+
+        """
+        return self(numpy.linspace(0, 1, nx), numpy.linspace(0, 1, ny))
+
 
 class CGrid(object):
     """
@@ -691,6 +1194,679 @@ class CGrid_geo(CGrid):
         self.mask_polygon(zip(x, y), mask_value)
 
 
+class SigmaCache(object):
+    """
+    Least-recently-used cache of converged sigma values.
+
+    Solving for the sigmas is usually the most expensive part of grid
+    generation, but they only depend on the boundary geometry, not on
+    the shape, focus or ``nppe`` of the grid. :class:`~Gridgen` looks
+    up the sigmas of its boundary here before calling gridgen-c and
+    stores the converged values afterwards, so repeated generations of
+    the same domain start from the solution.
+
+    Parameters
+    ----------
+    maxsize : int, optional (default = 128)
+        Maximum number of boundaries held in memory.
+    cachedir : str, optional
+        Directory in which sigmas are also saved as ``.npy`` files so
+        that they survive the process. The directory is created if it
+        does not exist. By default nothing is written to disk.
+    disk_maxsize : int, optional (default = 1024)
+        Maximum number of files kept in ``cachedir``. The least
+        recently used files are removed first.
+
+    See also
+    --------
+    default_sigma_cache : the cache shared by all Gridgen objects
+
+    """
+
+    def __init__(self, maxsize=128, cachedir=None, disk_maxsize=1024):
+        self.maxsize = maxsize
+        self.cachedir = cachedir
+        self.disk_maxsize = disk_maxsize
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.cachedir is not None and not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+
+    @staticmethod
+    def key(xbry, ybry, beta, ul_idx, thin):
+        """
+        Hash of the inputs that determine the sigma values.
+
+        Parameters
+        ----------
+        xbry, ybry, beta : array-like
+            The boundary and turning values as passed to gridgen-c.
+        ul_idx : int
+            Index of the upper left corner.
+        thin : bool
+            Whether redundant boundary vertices are thinned.
+
+        Returns
+        -------
+        key : str
+
+        """
+
+        sha = hashlib.sha1()
+        for array in (xbry, ybry, beta):
+            sha.update(numpy.ascontiguousarray(array, dtype='<f8').tobytes())
+        sha.update('{:d}:{:d}'.format(int(ul_idx), int(thin)).encode('ascii'))
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cachedir, key + '.npy')
+
+    def get(self, key):
+        """
+        Return the cached sigmas for ``key`` or None.
+        """
+
+        with self._lock:
+            if key in self._memory:
+                self._memory[key] = self._memory.pop(key)
+                return self._memory[key]
+
+        if self.cachedir is not None:
+            try:
+                sigmas = numpy.load(self._path(key))
+                os.utime(self._path(key), None)
+            except (IOError, OSError, ValueError):
+                return None
+            sigmas.flags.writeable = False
+            self._remember(key, sigmas)
+            return sigmas
+
+        return None
+
+    def put(self, key, sigmas):
+        """
+        Store a copy of ``sigmas`` under ``key``.
+        """
+
+        sigmas = numpy.array(sigmas, dtype='d')
+        sigmas.flags.writeable = False
+        self._remember(key, sigmas)
+
+        if self.cachedir is not None:
+            # write then replace so other processes never read partial files
+            tmp = self._path('{}.{}'.format(key, os.getpid()))
+            numpy.save(tmp, sigmas)
+            os.replace(tmp, self._path(key))
+            self._prune_disk()
+
+    def clear(self):
+        """
+        Remove everything from the cache, including files on disk.
+        """
+
+        with self._lock:
+            self._memory.clear()
+
+        if self.cachedir is not None:
+            for name in os.listdir(self.cachedir):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(self.cachedir, name))
+
+    def _remember(self, key, sigmas):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._memory[key] = sigmas
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _prune_disk(self):
+        files = [
+            os.path.join(self.cachedir, name)
+            for name in os.listdir(self.cachedir)
+            if name.endswith('.npy')
+        ]
+        if len(files) <= self.disk_maxsize:
+            return
+
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.disk_maxsize]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def __contains__(self, key):
+        return key in self._memory or (
+            self.cachedir is not None and os.path.exists(self._path(key))
+        )
+
+    def __len__(self):
+        return len(self._memory)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+#: The :class:`~SigmaCache` used by :class:`~Gridgen` unless told otherwise.
+default_sigma_cache = SigmaCache()
+
+
+class ConformalMap(object):
+    """
+    Conformal map of a polygon onto the canonical rectangle.
+
+    Grid generation involves solving for the sigmas of the boundary
+    (the Broyden iterations, expensive for complex boundaries) and
+    mapping nodes in the canonical rectangle back into the polygon. A
+    ConformalMap solves for the sigmas once and then maps any number of
+    point sets, e.g., at a new resolution or focus, or extra points for
+    nesting.
+
+    libgridgen has no entry point that keeps its solved state between
+    calls, so only the sigmas are kept and passed back in. Every call
+    to :meth:`~map` therefore still runs the whole of
+    ``gridgen_generategrid2``: the triangulation, one evaluation of the
+    residual over all quadrilaterals (to confirm convergence), the
+    image polygon and the mapping of the quadrilaterals, followed by
+    the points themselves. Only the sigma iterations are skipped. Use
+    :meth:`~map_many` to pay for this once for several point sets.
+
+    Parameters
+    ----------
+    xbry, ybry, beta, ul_idx
+        The boundary, as for :class:`~Gridgen`. No projection is
+        applied.
+    nnodes, precision, nppe, newton, thin, checksimplepoly, verbose
+        Options passed through to gridgen-c, as for :class:`~Gridgen`.
+    sigmas : array-like, optional
+        Previously converged sigmas of this boundary.
+    autosolve : bool, optional (default = True)
+        Toggles solving for the sigmas upon instantiation. Otherwise
+        this happens on the first call to :meth:`~map`.
+    normalize : bool, optional (default = True)
+        Toggles passing the boundary to gridgen-c scaled to the unit
+        box, which makes ``precision`` relative, as for
+        :class:`~Gridgen`.
+    continuation : bool, optional (default = False)
+        Toggles seeding the solve with a cheap, low precision one, as
+        for :class:`~Gridgen`.
+
+    Examples
+    --------
+    >>> cmap = pygridgen.ConformalMap(x, y, beta)
+    >>> xi, eta = numpy.meshgrid(numpy.linspace(0, 1, 50),
+    ...                          numpy.linspace(0, 1, 100))
+    >>> x, y = cmap.map(xi, eta)
+
+    """
+
+    def __init__(self, xbry, ybry, beta, ul_idx=0, nnodes=14,
+                 precision=1.0e-12, nppe=3, newton=True, thin=True,
+                 checksimplepoly=True, verbose=False, sigmas=None,
+                 autosolve=True, normalize=True, continuation=False):
+
+        self.xbry = numpy.asarray(xbry, dtype='d')
+        self.ybry = numpy.asarray(ybry, dtype='d')
+        self.beta = numpy.asarray(beta, dtype='d')
+        if not numpy.isclose(self.beta.sum(), 4.0):
+            raise ValueError('sum of beta must be 4.0')
+
+        self.ul_idx = ul_idx
+        self.nnodes = nnodes
+        self.precision = precision
+        self.nppe = nppe
+        self.newton = newton
+        self.thin = thin
+        self.checksimplepoly = checksimplepoly
+        self.verbose = verbose
+        self.normalize = normalize
+        self.continuation = continuation
+
+        self.sigmas = None if sigmas is None else numpy.asarray(sigmas, dtype='d')
+        self.xrect = None
+        self.yrect = None
+
+        if autosolve:
+            self.solve()
+
+    @property
+    def solved(self):
+        """ Whether the sigmas of the boundary are known. """
+        return self.sigmas is not None
+
+    def _call(self, shape, xgrid=None, ygrid=None):
+        lib = load_libgridgen()
+        xbry, ybry, transform = self.xbry, self.ybry, None
+        if self.normalize:
+            xbry, ybry, transform = _normalize_boundary(xbry, ybry)
+
+        if self.continuation and self.sigmas is None:
+            self.sigmas = _continuation_sigmas(
+                lib, xbry, ybry, self.beta, self.ul_idx, nnodes=self.nnodes,
+                newton=self.newton, precision=self.precision,
+                checksimplepoly=self.checksimplepoly, thin=self.thin,
+                nppe=self.nppe, verbose=self.verbose
+            )
+
+        gn, sigmas, xrect, yrect = _generategrid2(
+            lib, xbry, ybry, self.beta, self.ul_idx, shape,
+            xgrid=xgrid, ygrid=ygrid, nnodes=self.nnodes, newton=self.newton,
+            precision=self.precision, checksimplepoly=self.checksimplepoly,
+            thin=self.thin, nppe=self.nppe, verbose=self.verbose,
+            sigmas=self.sigmas
+        )
+
+        try:
+            x = _nodes_as_array(lib.gridnodes_getx(gn), shape)
+            y = _nodes_as_array(lib.gridnodes_gety(gn), shape)
+        finally:
+            lib.gridnodes_destroy(gn)
+
+        if transform is not None:
+            x, y = _denormalize(x, y, transform)
+
+        self.sigmas = sigmas
+        self.xrect = xrect
+        self.yrect = yrect
+        return x, y
+
+    def solve(self):
+        """
+        Solve for the sigmas (if not already known) and the image of the
+        boundary in the canonical rectangle.
+
+        Only a 2x2 grid is mapped along the way, so the cost is that
+        of triangulating the boundary and the sigma iterations.
+
+        """
+
+        if not self.solved or self.xrect is None:
+            self._call((2, 2))
+
+    def map(self, xi, eta, nprocs=1):
+        """
+        Map points from the canonical rectangle into the polygon.
+
+        Parameters
+        ----------
+        xi, eta : array-like
+            Normalized positions in [0, 1] along the x and y-directions
+            of the grid. The arrays are broadcast against each other.
+        nprocs : int, optional (default = 1)
+            Number of worker processes among which blocks of rows (or
+            of points) are divided. Each worker makes its own call into
+            gridgen-c, which repeats the triangulation and set-up
+            (see :class:`~ConformalMap`). The result agrees with a
+            serial mapping to within the requested precision, but is
+            not bit-identical: a point on the edge of two quadrilaterals
+            is mapped through whichever one gridgen-c finds first, and
+            that depends on the points mapped before it.
+
+        Returns
+        -------
+        x, y : numpy.ndarray
+            Positions of the points in the polygon, with the shape of
+            the broadcast inputs. Points that could not be mapped are
+            NaN.
+
+        """
+
+        xi, eta = numpy.broadcast_arrays(
+            numpy.asarray(xi, dtype='d'),
+            numpy.asarray(eta, dtype='d')
+        )
+        if numpy.any((xi < 0) | (xi > 1) | (eta < 0) | (eta > 1)):
+            raise ValueError('xi and eta must be within the range [0, 1]')
+
+        if xi.size == 0:
+            return numpy.empty(xi.shape), numpy.empty(xi.shape)
+
+        if nprocs > 1:
+            return self._map_parallel(xi, eta, nprocs)
+
+        # grids are passed as they are. Anything else is sorted along a
+        # Z-order curve, so that successive points tend to fall in the
+        # same quadrilateral, and laid out as a nearly square block,
+        # padded by repeating the last point
+        if xi.ndim == 2 and min(xi.shape) >= 2:
+            x, y = self._call(xi.shape, xi, eta)
+            return x, y
+
+        npts = xi.size
+        order = _morton_order(xi.ravel(), eta.ravel())
+        nx = max(int(numpy.ceil(numpy.sqrt(npts))), 2)
+        ny = max(-(-npts // nx), 2)
+        pad = ny * nx - npts
+        xgrid = numpy.append(xi.ravel()[order], numpy.repeat(xi.flat[order[-1]], pad))
+        ygrid = numpy.append(eta.ravel()[order], numpy.repeat(eta.flat[order[-1]], pad))
+
+        xnodes, ynodes = self._call((ny, nx), xgrid, ygrid)
+        x = numpy.empty(npts)
+        y = numpy.empty(npts)
+        x[order] = xnodes.ravel()[:npts]
+        y[order] = ynodes.ravel()[:npts]
+        return x.reshape(xi.shape), y.reshape(xi.shape)
+
+    def map_many(self, points, nprocs=1):
+        """
+        Map several sets of points with a single call into gridgen-c.
+
+        Every call re-triangulates the boundary and rebuilds the
+        Schwarz-Christoffel maps of its quadrilaterals before mapping
+        any points, so evaluating many small sets of points together
+        is considerably faster than one call to :meth:`~map` each. The
+        points themselves are still evaluated one at a time by the
+        Schwarz-Christoffel routines of the prebuilt libgridgen.
+
+        Parameters
+        ----------
+        points : sequence of two-tuples of array-like (xi, eta)
+            The sets of points, as for :meth:`~map`.
+        nprocs : int, optional (default = 1)
+            Number of worker processes, as for :meth:`~map`.
+
+        Returns
+        -------
+        mapped : list of two-tuples of numpy.ndarray (x, y)
+            The mapped points of each set, in the shapes of the
+            (broadcast) inputs.
+
+        """
+
+        sets = [
+            numpy.broadcast_arrays(numpy.asarray(xi, dtype='d'),
+                                   numpy.asarray(eta, dtype='d'))
+            for xi, eta in points
+        ]
+        if not sets:
+            return []
+
+        x, y = self.map(numpy.concatenate([xi.ravel() for xi, _ in sets]),
+                        numpy.concatenate([eta.ravel() for _, eta in sets]),
+                        nprocs=nprocs)
+
+        bounds = numpy.cumsum([0] + [xi.size for xi, _ in sets])
+        return [
+            (x[start:stop].reshape(xi.shape), y[start:stop].reshape(xi.shape))
+            for (xi, _), start, stop in zip(sets, bounds[:-1], bounds[1:])
+        ]
+
+    def map_interpolated(self, xi, eta, tolerance=None,
+                         stride=INTERPOLATION_STRIDE, nprocs=1):
+        """
+        Map a tensor-product grid, interpolating where the map is smooth.
+
+        Only a coarse lattice (every ``stride``-th node) and the centres
+        of its cells are mapped exactly, together in one call (see
+        :meth:`~map_many`). The other nodes are filled in by
+        cubic interpolation from the lattice. The map is analytic away
+        from the corners of the boundary, so the interpolation error is
+        usually tiny; it is estimated at the centres of the lattice
+        cells, and the nodes of cells (and their neighbours) where it
+        exceeds ``tolerance`` are mapped exactly, as are nodes near
+        points that cannot be mapped.
+
+        Parameters
+        ----------
+        xi, eta : array-like
+            One dimensional, normalized positions in [0, 1] of the
+            columns and rows of the grid (e.g., from
+            :meth:`Focus.vectors`).
+        tolerance : float, optional
+            Maximum interpolation error, relative to the extent of the
+            boundary. Defaults to ``precision``; values as small as the
+            default precision leave little to interpolate.
+        stride : int, optional (default = ``INTERPOLATION_STRIDE``)
+            Number of nodes per interval of the lattice.
+        nprocs : int, optional (default = 1)
+            Number of worker processes for the exact mappings.
+
+        Returns
+        -------
+        x, y : numpy.ndarray
+            The ``(len(eta), len(xi))`` mapped nodes.
+
+        """
+        x, y, _ = self._map_interpolated(xi, eta, tolerance, stride, nprocs)
+        return x, y
+
+    def _map_interpolated(self, xi, eta, tolerance, stride, nprocs):
+        # also returns the number of nodes that were interpolated
+        xi = numpy.asarray(xi, dtype='d')
+        eta = numpy.asarray(eta, dtype='d')
+        if xi.ndim != 1 or eta.ndim != 1:
+            raise ValueError('xi and eta must be one dimensional')
+        if (numpy.any((xi < 0) | (xi > 1)) or
+                numpy.any((eta < 0) | (eta > 1))):
+            raise ValueError('xi and eta must be within the range [0, 1]')
+
+        mx = max(-(-(xi.size - 1) // stride) + 1, 4)
+        my = max(-(-(eta.size - 1) // stride) + 1, 4)
+        if mx >= xi.size or my >= eta.size:
+            # too small to gain anything
+            x, y = self.map(xi[None, :], eta[:, None], nprocs=nprocs)
+            return x, y, 0
+
+        if tolerance is None:
+            tolerance = self.precision
+        extent = max(numpy.ptp(self.xbry), numpy.ptp(self.ybry))
+        tolerance = tolerance * extent
+
+        # the lattice and the centres of its cells, in one call
+        tx = numpy.linspace(0, 1, mx)
+        ty = numpy.linspace(0, 1, my)
+        tx_mid = 0.5 * (tx[:-1] + tx[1:])
+        ty_mid = 0.5 * (ty[:-1] + ty[1:])
+        (xc, yc), (xm, ym) = self.map_many(
+            [(tx[None, :], ty[:, None]), (tx_mid[None, :], ty_mid[:, None])],
+            nprocs=nprocs
+        )
+
+        invalid = numpy.isnan(xc) | numpy.isnan(yc)
+        xc = numpy.where(invalid, 0.0, xc)
+        yc = numpy.where(invalid, 0.0, yc)
+
+        def interpolate(tx_, ty_):
+            wx, sx, cellx = _lagrange_weights(tx_, mx)
+            wy, sy, celly = _lagrange_weights(ty_, my)
+            x = wy.dot(xc).dot(wx.T)
+            y = wy.dot(yc).dot(wx.T)
+            touches = sy.astype(float).dot(invalid).dot(sx.T) > 0
+            return x, y, touches, cellx, celly
+
+        # estimate the error of each cell at its centre
+        xi_m, yi_m, touches, _, _ = interpolate(tx_mid, ty_mid)
+        error = numpy.hypot(xi_m - xm, yi_m - ym)
+        bad = touches | numpy.isnan(error) | (error > tolerance)
+
+        # include the neighbouring cells
+        flagged = bad.copy()
+        flagged[1:, :] |= bad[:-1, :]
+        flagged[:-1, :] |= bad[1:, :]
+        flagged[:, 1:] |= flagged[:, :-1].copy()
+        flagged[:, :-1] |= flagged[:, 1:].copy()
+
+        x, y, touches, cellx, celly = interpolate(xi, eta)
+        exact = touches | flagged[celly][:, cellx]
+        if numpy.any(exact):
+            rows, cols = numpy.nonzero(exact)
+            x[rows, cols], y[rows, cols] = self.map(xi[cols], eta[rows],
+                                                    nprocs=nprocs)
+
+        return x, y, int(exact.size - numpy.count_nonzero(exact))
+
+    def _map_parallel(self, xi, eta, nprocs):
+        # the workers must not each solve for the sigmas
+        self.solve()
+
+        if xi.ndim == 2:
+            blocks = self._row_blocks(xi, eta, nprocs)
+            axis = 0
+        else:
+            order = _morton_order(xi.ravel(), eta.ravel())
+            splits = numpy.array_split(order, min(nprocs, xi.size))
+            blocks = [(self, xi.flat[idx], eta.flat[idx]) for idx in splits]
+            axis = None
+
+        pool = multiprocessing.Pool(len(blocks), initializer=load_libgridgen,
+                                    initargs=(load_libgridgen()._name,))
+        try:
+            results = pool.map(_map_block, blocks)
+        finally:
+            pool.close()
+            pool.join()
+
+        if axis == 0:
+            x = numpy.concatenate([r[0] for r in results], axis=0)
+            y = numpy.concatenate([r[1] for r in results], axis=0)
+        else:
+            x = numpy.empty(xi.size)
+            y = numpy.empty(xi.size)
+            for idx, (xb, yb) in zip(splits, results):
+                x[idx] = xb
+                y[idx] = yb
+            x = x.reshape(xi.shape)
+            y = y.reshape(xi.shape)
+
+        return x, y
+
+    def _row_blocks(self, xi, eta, nblocks):
+        """ Split a grid into blocks of whole rows, at least two each. """
+        nblocks = max(min(nblocks, xi.shape[0] // 2), 1)
+        splits = numpy.array_split(numpy.arange(xi.shape[0]), nblocks)
+        return [(self, xi[rows], eta[rows]) for rows in splits]
+
+
+def _map_block(args):
+    """ Map one block of points in a worker process. """
+    cmap, xi, eta = args
+    return cmap.map(xi, eta)
+
+
+def _node_positions(shape, focus=None):
+    """
+    Normalized positions of the nodes of a grid of ``shape``.
+
+    A :class:`~Focus` is applied to the row and column vectors only and
+    the results are broadcast (without copying) to the full grid. Other
+    focus callables are applied to every node.
+    """
+    ny, nx = shape
+    if isinstance(focus, Focus):
+        x, y = focus.vectors(nx, ny)
+        return (numpy.broadcast_to(x, shape),
+                numpy.broadcast_to(y[:, None], shape))
+
+    y, x = numpy.mgrid[0:1:ny*1j, 0:1:nx*1j]
+    if focus is not None:
+        x, y = focus(x, y)
+    return x, y
+
+
+def _douglas_peucker(x, y, tolerance):
+    """
+    Indices of the vertices of the open polyline (``x``, ``y``) kept by
+    the Douglas-Peucker algorithm. The end points are always kept.
+    """
+    keep = numpy.zeros(len(x), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(x) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first+1:last] - x[first], y[first+1:last] - y[first]
+        length = numpy.hypot(dx, dy)
+        if length > 0:
+            dist = numpy.abs(dx * py - dy * px) / length
+        else:
+            dist = numpy.hypot(px, py)
+
+        imax = numpy.argmax(dist)
+        if dist[imax] > tolerance:
+            mid = first + 1 + imax
+            keep[mid] = True
+            stack.extend([(first, mid), (mid, last)])
+
+    return numpy.flatnonzero(keep)
+
+
+def simplify_boundary(xbry, ybry, beta, tolerance, ul_idx=0):
+    """
+    Remove boundary vertices that barely change the shape of the
+    polygon.
+
+    Digitized shorelines often have many nearly collinear vertices,
+    each of which adds to the cost of solving for the sigmas. The
+    Douglas-Peucker algorithm is applied to every stretch of the
+    boundary between two corners (vertices with a non-zero ``beta``
+    or the ``ul_idx`` vertex), which are always kept.
+
+    Parameters
+    ----------
+    xbry, ybry, beta, ul_idx
+        The boundary, as for :class:`~Gridgen`.
+    tolerance : float
+        Maximum distance, in the units of the boundary, between a
+        removed vertex and the simplified boundary.
+
+    Returns
+    -------
+    xbry, ybry, beta : numpy.ndarray
+        The simplified boundary.
+    ul_idx : int
+        The index of the upper left corner in the simplified boundary.
+
+    Notes
+    -----
+    Removing vertices can make a polygon self-intersecting when parts
+    of the boundary are closer together than ``tolerance``; keep
+    ``checksimplepoly`` on to catch this.
+
+    Examples
+    --------
+    >>> x, y, beta, ul_idx = pygridgen.simplify_boundary(
+    ...     x, y, beta, tolerance=10.0
+    ... )
+
+    """
+
+    xbry = numpy.asarray(xbry, dtype='d')
+    ybry = numpy.asarray(ybry, dtype='d')
+    beta = numpy.asarray(beta, dtype='d')
+    if not (xbry.shape == ybry.shape == beta.shape):
+        raise ValueError('`xbry`, `ybry` and `beta` must be the same length')
+    if tolerance < 0:
+        raise ValueError('`tolerance` must not be negative')
+
+    nbry = len(xbry)
+    anchors = numpy.flatnonzero(beta != 0)
+    anchors = numpy.union1d(anchors, [ul_idx % nbry])
+    if len(anchors) == 0:
+        anchors = numpy.array([0])
+
+    # walk each stretch between consecutive corners (wrapping around)
+    keep = []
+    stops = numpy.append(anchors[1:], anchors[0] + nbry)
+    for start, stop in zip(anchors, stops):
+        index = numpy.arange(start, stop + 1) % nbry
+        kept = _douglas_peucker(xbry[index], ybry[index], tolerance)
+        keep.extend(index[kept[:-1]])
+
+    keep = numpy.sort(keep)
+    return (xbry[keep], ybry[keep], beta[keep],
+            int(numpy.searchsorted(keep, ul_idx % nbry)))
+
+
 class Gridgen(CGrid):
     """
     Main class for curvilinear-orthogonal grid generation.
@@ -730,11 +1906,11 @@ class Gridgen(CGrid):
         precision and computation time. A rule of thumb is that this
         should be equal to or slightly larger than `-log10(precision)`.
     precision : float, optional (default = 1.0e-12)
-        The precision with which the grid is generated. The default
-        value is good for lat/lon coordinate (i.e., smaller magnitudes
-        of boundary coordinates). You can relax this to e.g., 1e-3 when
-        working in state plane or UTM grids and you'll typically get
-        better performance.
+        The precision with which the grid is generated. With
+        ``normalize`` (the default) it is relative to the extent of the
+        boundary, so the same value behaves alike for lat/lon, state
+        plane or UTM coordinates. Relax it (e.g., to 1e-6) for better
+        performance when that is accurate enough.
     nppe : int, optional (default = 3)
         The number of points per internal edge. Lower values will
         coarsen the image.
@@ -754,6 +1930,72 @@ class Gridgen(CGrid):
     autogen : bool, optional (default = True)
         Toggles the automatic generation of the grid. Set to False if
         you want to delay calling the ``generate_grid`` method.
+    nprocs : int, optional (default = 1)
+        Number of worker processes used to map the nodes. With more
+        than one, the sigmas are solved for first and blocks of rows are
+        then mapped concurrently. gridgen-c keeps global state, so
+        processes are used rather than threads. Every worker repeats
+        the triangulation and set-up of the map (see
+        :class:`~ConformalMap`), and the nodes agree with a serial run
+        to within ``precision`` rather than bit for bit. The sigma solve itself
+        is a single call into gridgen-c and always runs serially: the
+        residual is evaluated quadrilateral by quadrilateral inside the
+        prebuilt libgridgen. Use ``sigma_cache`` to avoid repeating it.
+    timeout : float, optional
+        Maximum time in seconds allowed for generating the grid. When
+        given, the grid is generated in a worker process that is
+        terminated if it runs over, and ``generate_grid`` raises a
+        ``TimeoutError``. gridgen-c cannot be interrupted part way
+        through its solve, so no partial solution is kept. The grid is
+        pickled to the worker, so ``focus`` must be picklable (e.g., a
+        :class:`~Focus` or a module level function, not a lambda).
+    isolate : bool, optional (default = False)
+        Toggles generating the grid in a worker process even without a
+        ``timeout``. This lets :meth:`~cancel` stop the generation
+        within milliseconds rather than at the next phase boundary.
+    sigma_cache : :class:`~SigmaCache` or bool, optional (default = True)
+        Cache used to seed the solver with (and store) the sigmas of
+        the boundary. True uses ``default_sigma_cache``, which is shared
+        by all grids; False or None disables caching.
+    normalize : bool, optional (default = True)
+        Toggles translating and scaling the boundary into the unit box
+        before it is passed to gridgen-c; the nodes are mapped back to
+        the original coordinates. Without it, ``precision`` is an
+        absolute tolerance in the units of the boundary.
+    continuation : bool, optional (default = False)
+        Toggles solving for the sigmas in two steps: first to a loose
+        precision (``CONTINUATION_PRECISION``) with few quadrature
+        nodes, and then to ``precision`` starting from that solution.
+        This takes far fewer of the expensive iterations for boundaries
+        with many vertices. It has no effect when the sigmas are already
+        known (e.g., from the sigma cache).
+    interpolate : float, optional
+        Relative tolerance with which nodes may be interpolated from an
+        exactly mapped coarse lattice rather than mapped one by one, see
+        :meth:`ConformalMap.map_interpolated`. This can be much faster
+        for large grids. Requires ``focus`` to be a :class:`~Focus` (or
+        None).
+    simplify : float, optional
+        Tolerance, in the units of the (projected) boundary, with which
+        nearly collinear boundary vertices are removed before the grid
+        is generated. Corners (non-zero ``beta``) are always kept. See
+        :func:`~simplify_boundary`.
+    free_gridnodes : bool, optional (default = False)
+        Toggles destroying gridgen-c's gridnodes object as soon as the
+        nodes have been copied into ``x`` and ``y``. Otherwise it is
+        kept until :meth:`~close` is called (or the grid is used as a
+        context manager, or deleted).
+
+    Notes
+    -----
+    gridgen-c keeps global state and is neither reentrant nor
+    thread-safe. To keep threads from corrupting that state, calls into
+    it are serialized by a process-wide lock: grids generated from
+    several threads are generated one after another, never
+    concurrently. gridgen-c also calls ``exit()`` on some invalid
+    input, which ends the whole process, every thread included. Use
+    :func:`~pygridgen.generate_many` to generate grids concurrently and
+    to contain such failures in worker processes.
 
     Example
     -------
@@ -780,34 +2022,12 @@ class Gridgen(CGrid):
     def __init__(self, xbry, ybry, beta, shape, ul_idx=0, focus=None,
                  proj=None, nnodes=14, precision=1.0e-12, nppe=3,
                  newton=True, thin=True, checksimplepoly=True,
-                 verbose=False, autogen=True):
-
-        # find the gridgen-c shared library
-        libgridgen_paths = [
-            ('libgridgen.so', os.path.join(sys.prefix, 'lib')),
-            ('libgridgen', os.path.join(sys.prefix, 'lib')),
-            ('libgridgen.so', '/usr/local/lib'),
-            ('libgridgen', '/usr/local/lib'),
-        ]
+                 verbose=False, autogen=True, nprocs=1, timeout=None,
+                 isolate=False, sigma_cache=True, free_gridnodes=False,
+                 normalize=True, simplify=None, continuation=False,
+                 interpolate=None):
 
-        for name, path in libgridgen_paths:
-            try:
-                self._libgridgen = numpy.ctypeslib.load_library(name, path)
-                break
-            except OSError:
-                pass
-            else:
-                print("libgridgen: attempted names/locations")
-                print(libgridgen_paths)
-                raise OSError('Failed to load libgridgen.')
-
-        # initialize/set types of critical variables
-        self._libgridgen.gridgen_generategrid2.restype = ctypes.POINTER(ctypes.c_void_p)
-        self._libgridgen.gridnodes_getx.restype = ctypes.POINTER(ctypes.POINTER(ctypes.c_double))
-        self._libgridgen.gridnodes_gety.restype = ctypes.POINTER(ctypes.POINTER(ctypes.c_double))
-        self._libgridgen.gridnodes_getnce1.restype = ctypes.c_int
-        self._libgridgen.gridnodes_getnce2.restype = ctypes.c_int
-        self._libgridgen.gridmap_build.restype = ctypes.c_void_p
+        self._libgridgen = load_libgridgen()
 
         # store the boundary, reproject if possible
         self.xbry = numpy.asarray(xbry, dtype='d')
@@ -821,9 +2041,21 @@ class Gridgen(CGrid):
         if not numpy.isclose(self.beta.sum(), 4.0):
             raise ValueError('sum of beta must be 4.0')
 
+        # drop nearly collinear vertices
+        self.simplify = simplify
+        self._nboundary_removed = 0
+        if simplify is not None:
+            nbry = len(self.xbry)
+            self.xbry, self.ybry, self.beta, ul_idx = simplify_boundary(
+                self.xbry, self.ybry, self.beta, simplify, ul_idx
+            )
+            self._nboundary_removed = nbry - len(self.xbry)
+
         # properties
         self._sigmas = None
         self._nsigmas = None
+        self._xrect = None
+        self._yrect = None
         self._ny = shape[0]
         self._nx = shape[1]
         self._focus = focus
@@ -837,9 +2069,24 @@ class Gridgen(CGrid):
         self.thin = thin
         self.checksimplepoly = checksimplepoly
         self.verbose = verbose
+        self.nprocs = nprocs
+        self.timeout = timeout
+        self.isolate = isolate
+        self.free_gridnodes = free_gridnodes
+        self.normalize = normalize
+        self.continuation = continuation
+        self.interpolate = interpolate
+        self._cancelled = threading.Event()
+
+        if sigma_cache is True:
+            sigma_cache = default_sigma_cache
+        elif sigma_cache is False:
+            sigma_cache = None
+        self.sigma_cache = sigma_cache
 
         # initialize the gridnodes object
         self._gn = None
+        self.stats = {}
 
         # generate the grid
         if autogen:
@@ -847,12 +2094,56 @@ class Gridgen(CGrid):
 
     def __del__(self):
         """delete gridnode object upon deletion"""
-        self._libgridgen.gridnodes_destroy(self._gn)
+        if getattr(self, '_gn', None) is not None:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Destroy the gridnodes object held by gridgen-c.
+
+        The nodes have already been copied into ``x`` and ``y``, so the
+        grid stays usable. Calling this more than once is harmless, and
+        it is called automatically when the grid is used as a context
+        manager:
+
+        >>> with pygridgen.Gridgen(x, y, beta, shape=(50, 50)) as grid:
+        ...     x, y = grid.x_rho, grid.y_rho
+
+        """
+        if self._gn is not None:
+            self._libgridgen.gridnodes_destroy(self._gn)
+            self._gn = None
+
+    def __getstate__(self):
+        # the library handle and gridnodes pointer only mean something
+        # in this process; everything else is plain python/numpy
+        state = self.__dict__.copy()
+        state['_libgridgen'] = None
+        state['_gn'] = None
+        state['_cancelled'] = None
+        if self.sigma_cache is default_sigma_cache:
+            state['sigma_cache'] = True
+        return state
+
+    def __setstate__(self, state):
+        if state['sigma_cache'] is True:
+            state['sigma_cache'] = default_sigma_cache
+        self.__dict__.update(state)
+        self._libgridgen = load_libgridgen()
+        self._cancelled = threading.Event()
 
     @property
     def sigmas(self):
         """ Some weird intermediate value that takes a long time to the
-        C code to compute with complex boundaries. """
+        C code to compute with complex boundaries. Stored as a numpy
+        array after the grid has been generated and passed back to the
+        C code as the initial guess on subsequent generations. """
         return self._sigmas
 
     @sigmas.setter
@@ -868,6 +2159,20 @@ class Gridgen(CGrid):
     def nsigmas(self, value):
         self._nsigmas = value
 
+    @property
+    def xrect(self):
+        """ x-coordinates of the image of the corners of the boundary
+        (the vertices with a non-zero beta, in order) in the canonical
+        rectangle (index space) that the nodes are mapped from, one per
+        corner. Available once the grid has been generated. """
+        return self._xrect
+
+    @property
+    def yrect(self):
+        """ y-coordinates of the image of the boundary vertices in the
+        canonical rectangle. See :attr:`~xrect`. """
+        return self._yrect
+
     @property
     def nx(self):
         """ Number of nodes in the x-direction (columns). """
@@ -900,6 +2205,37 @@ class Gridgen(CGrid):
     def focus(self, value):
         self._focus = value
 
+    def _sigma_key(self):
+        return SigmaCache.key(self.xbry, self.ybry, self.beta,
+                              self.ul_idx, self.thin)
+
+    def conformal_map(self):
+        """
+        Return the :class:`~ConformalMap` of the grid's boundary.
+
+        The map is seeded with the sigmas of this grid (or of the sigma
+        cache), so it only needs solving if neither is available.
+
+        """
+
+        sigmas = self.sigmas
+        if sigmas is None and self.sigma_cache is not None:
+            sigmas = self.sigma_cache.get(self._sigma_key())
+
+        cmap = ConformalMap(
+            self.xbry, self.ybry, self.beta, ul_idx=self.ul_idx,
+            nnodes=self.nnodes, precision=self.precision, nppe=self.nppe,
+            newton=self.newton, thin=self.thin,
+            checksimplepoly=self.checksimplepoly, verbose=self.verbose,
+            sigmas=sigmas, normalize=self.normalize,
+            continuation=self.continuation
+        )
+
+        if self.sigma_cache is not None:
+            self.sigma_cache.put(self._sigma_key(), cmap.sigmas)
+
+        return cmap
+
     def generate_grid(self):
         """
         The business end of this whole thing. Collects all of the
@@ -907,76 +2243,306 @@ class Gridgen(CGrid):
         of node coordinates. Unless ``autogen`` was set to False, this
         happens when the object is instantiated.
 
+        Timings and counts of the generation are stored in the
+        ``stats`` dictionary:
+
+        ``nboundary``
+            number of boundary vertices
+        ``nboundary_removed``
+            number of boundary vertices removed by ``simplify``
+        ``nquadrilaterals``
+            number of quadrilaterals (one sigma each)
+        ``nodes_mapped``
+            number of nodes mapped into the polygon (not NaN)
+        ``nodes_nan``
+            number of nodes that could not be mapped
+        ``nodes_interpolated``
+            number of nodes interpolated rather than mapped exactly
+        ``sigmas_reused``
+            whether previously converged sigmas seeded the solver
+        ``time_prepare``
+            wall time (s) spent computing (focused) node positions
+        ``time_solve``
+            wall time (s) spent solving for the sigmas when this is done
+            separately (with ``nprocs`` or ``interpolate``). Otherwise
+            None: by default the sigmas are solved for in the same
+            gridgen-c call that maps the nodes, and the phases within
+            that call are not timed separately
+        ``time_map``
+            wall time (s) of the gridgen-c call(s) mapping the nodes,
+            including the sigma solve when ``time_solve`` is None
+        ``time_extract``
+            wall time (s) spent copying the nodes out of gridgen-c
+        ``time_total``
+            wall time (s) of the whole generation
+
         Parameters
         ----------
         None
 
         """
-        if self._gn is not None:
-            self._libgridgen.gridnodes_destroy(self._gn)
+        # forget any cancel() made while no generation was running
+        self._cancelled.clear()
+        self._run()
 
-        # number of boundary points
-        nbry = len(self.xbry)
+    def _run(self):
+        try:
+            self._generate()
+        finally:
+            self._cancelled.clear()
 
-        # sigma parameter
-        if self.sigmas is None:
-            self.nsigmas = ctypes.c_int(0)
-            self.sigmas = ctypes.c_void_p(0)
+    def _generate(self):
+        tstart = default_timer()
+        self.close()
 
-        # rectangularized domain
-        nrect = ctypes.c_int(0)
-        xrect = ctypes.c_void_p(0)
-        yrect = ctypes.c_void_p(0)
+        if self.timeout is not None or self.isolate:
+            # generate in a worker process that can be stopped in time
+            from .batch import generate_many
+            try:
+                pickle.dumps(self.focus)
+            except Exception:
+                raise ValueError('`timeout` and `isolate` need a focus that '
+                                 'can be pickled (e.g., not a lambda)')
+            result, = generate_many([self], processes=1, timeout=self.timeout,
+                                    cancel=self._cancelled)
+            if isinstance(result, Exception):
+                raise result
+            return
+
+        # reuse previously converged sigmas if we can
+        if self.sigmas is None and self.sigma_cache is not None:
+            self.sigmas = self.sigma_cache.get(self._sigma_key())
+        sigmas_reused = self.sigmas is not None
 
         # focus the grid if necessary
-        if self.focus is None:
-            ngrid = ctypes.c_int(0)
-            xgrid = ctypes.POINTER(ctypes.c_double)()
-            ygrid = ctypes.POINTER(ctypes.c_double)()
+        interpolated = 0
+        if self.interpolate is not None:
+            if self.focus is None:
+                xgrid = numpy.linspace(0, 1, self.nx)
+                ygrid = numpy.linspace(0, 1, self.ny)
+            elif isinstance(self.focus, Focus):
+                xgrid, ygrid = self.focus.vectors(self.nx, self.ny)
+            else:
+                raise ValueError('`interpolate` requires `focus` to be a Focus')
+        elif self.focus is None and self.nprocs <= 1:
+            xgrid = None
+            ygrid = None
         else:
-            y, x =  numpy.mgrid[0:1:self.ny*1j, 0:1:self.nx*1j]
-            xgrid, ygrid = self.focus(x, y)
-            ngrid = ctypes.c_int(xgrid.size)
-            xgrid = (ctypes.c_double * xgrid.size)(*xgrid.flatten())
-            ygrid = (ctypes.c_double * ygrid.size)(*ygrid.flatten())
-
-        # call the C-code to make make the grid
-        self._gn = self._libgridgen.gridgen_generategrid2(
-            ctypes.c_int(nbry),
-            (ctypes.c_double * nbry)(*self.xbry),
-            (ctypes.c_double * nbry)(*self.ybry),
-            (ctypes.c_double * nbry)(*self.beta),
-            ctypes.c_int(self.ul_idx),
-            ctypes.c_int(self.nx),
-            ctypes.c_int(self.ny),
-            ngrid,
-            xgrid,
-            ygrid,
-            ctypes.c_int(self.nnodes),
-            ctypes.c_int(self.newton),
-            ctypes.c_double(self.precision),
-            ctypes.c_int(self.checksimplepoly),
-            ctypes.c_int(self.thin),
-            ctypes.c_int(self.nppe),
-            ctypes.c_int(self.verbose),
-            ctypes.byref(self.nsigmas),
-            ctypes.byref(self.sigmas),
-            ctypes.byref(nrect),
-            ctypes.byref(xrect),
-            ctypes.byref(yrect)
-        )
+            xgrid, ygrid = _node_positions(self.shape, self.focus)
+
+        tprepared = default_timer()
+        self._check_cancelled()
+        if self.nprocs > 1 or self.interpolate is not None:
+            # solve once, then map blocks of rows in worker processes
+            # or interpolate from a coarse lattice
+            cmap = self.conformal_map()
+            tsolved = default_timer()
+            self._check_cancelled()
+            if self.interpolate is not None:
+                x, y, interpolated = cmap._map_interpolated(
+                    xgrid, ygrid, self.interpolate, INTERPOLATION_STRIDE,
+                    self.nprocs
+                )
+            else:
+                x, y = cmap.map(xgrid, ygrid, nprocs=self.nprocs)
+            self.sigmas = cmap.sigmas
+            self._xrect, self._yrect = cmap.xrect, cmap.yrect
+            tmapped = textracted = default_timer()
+        else:
+            xbry, ybry, transform = self.xbry, self.ybry, None
+            if self.normalize:
+                xbry, ybry, transform = _normalize_boundary(xbry, ybry)
+
+            if self.continuation and self.sigmas is None:
+                self.sigmas = _continuation_sigmas(
+                    self._libgridgen, xbry, ybry, self.beta, self.ul_idx,
+                    nnodes=self.nnodes, newton=self.newton,
+                    precision=self.precision,
+                    checksimplepoly=self.checksimplepoly, thin=self.thin,
+                    nppe=self.nppe, verbose=self.verbose
+                )
 
-        # x-positions
-        x = self._libgridgen.gridnodes_getx(self._gn)
-        x = numpy.asarray([x[0][i] for i in range(self.ny*self.nx)])
-        x.shape = (self.ny, self.nx)
+            # call the C-code to make make the grid
+            self._gn, self.sigmas, self._xrect, self._yrect = _generategrid2(
+                self._libgridgen, xbry, ybry, self.beta,
+                self.ul_idx, self.shape, xgrid=xgrid, ygrid=ygrid,
+                nnodes=self.nnodes, newton=self.newton,
+                precision=self.precision,
+                checksimplepoly=self.checksimplepoly, thin=self.thin,
+                nppe=self.nppe, verbose=self.verbose, sigmas=self.sigmas
+            )
+            tsolved = None
+            tmapped = default_timer()
+
+            # x- and y-positions
+            x = _nodes_as_array(self._libgridgen.gridnodes_getx(self._gn), self.shape)
+            y = _nodes_as_array(self._libgridgen.gridnodes_gety(self._gn), self.shape)
+            if transform is not None:
+                x, y = _denormalize(x, y, transform)
+            if self.free_gridnodes:
+                self.close()
+            textracted = default_timer()
+
+        # keep the converged sigmas for the next generation
+        self.nsigmas = self.sigmas.size
+        if self.sigma_cache is not None:
+            self.sigma_cache.put(self._sigma_key(), self.sigmas)
+
+        self._set_nodes(x, y)
+
+        nodes_nan = int(numpy.sum(numpy.isnan(x) | numpy.isnan(y)))
+        self.stats = {
+            'nboundary': len(self.xbry),
+            'nboundary_removed': self._nboundary_removed,
+            'nquadrilaterals': self.nsigmas,
+            'nodes_mapped': x.size - nodes_nan,
+            'nodes_nan': nodes_nan,
+            'nodes_interpolated': interpolated,
+            'sigmas_reused': sigmas_reused,
+            'time_prepare': tprepared - tstart,
+            'time_solve': None if tsolved is None else tsolved - tprepared,
+            'time_map': tmapped - (tprepared if tsolved is None else tsolved),
+            'time_extract': textracted - tmapped,
+            'time_total': default_timer() - tstart,
+        }
+
+    def cancel(self):
+        """
+        Ask a generation in progress (e.g., in another thread or via
+        :meth:`~generate_async`) to stop.
+
+        The generation raises ``concurrent.futures.CancelledError``.
+        If it runs in a worker process (see ``timeout`` and
+        ``isolate``), the worker is terminated immediately. Otherwise
+        gridgen-c cannot be interrupted and the generation stops at the
+        next phase boundary, i.e., before the solve or before mapping.
+        Without a generation in progress this has no effect: the next
+        one starts afresh.
+
+        """
+
+        self._cancelled.set()
 
-        # y-positions
-        y = self._libgridgen.gridnodes_gety(self._gn)
-        y = numpy.asarray([y[0][i] for i in range(self.ny*self.nx)])
-        y.shape = (self.ny, self.nx)
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            from concurrent.futures import CancelledError
+            raise CancelledError('generation of the grid was cancelled')
 
-        # mask out invalid values
+    def sweep(self, shapes, foci=None, nprocs=None):
+        """
+        Generate the grid's domain at several resolutions.
+
+        The sigmas are solved for once (or not at all if they are
+        already known) and reused for each shape, which is what a mesh
+        convergence study needs. Each shape still costs one call into
+        gridgen-c with the set-up described in :class:`~ConformalMap`.
+
+        Parameters
+        ----------
+        shapes : sequence of two-tuples of ints (ny, nx)
+            The shapes of the grids to generate.
+        foci : sequence of :class:`~Focus` (or None), optional
+            One focus per shape. By default the grid's own focus is
+            used for every shape.
+        nprocs : int, optional
+            Number of worker processes. Rows of all of the grids are
+            mapped concurrently. Defaults to the grid's ``nprocs``.
+
+        Yields
+        ------
+        grid : :class:`~CGrid`
+            The grid of each shape, in order.
+
+        Examples
+        --------
+        >>> shapes = [(50, 50), (100, 100), (200, 200), (400, 400)]
+        >>> for cgrid in grid.sweep(shapes, nprocs=4):
+        ...     print(cgrid.x.shape)
+
+        """
+
+        if foci is None:
+            foci = [self.focus] * len(shapes)
+        elif len(foci) != len(shapes):
+            raise ValueError('foci and shapes must be the same length')
+
+        if nprocs is None:
+            nprocs = self.nprocs
+
+        cmap = self.conformal_map()
+        self.sigmas = cmap.sigmas
+        self.nsigmas = self.sigmas.size
+        self._xrect, self._yrect = cmap.xrect, cmap.yrect
+
+        def positions():
+            for shape, focus in zip(shapes, foci):
+                yield _node_positions(shape, focus)
+
+        if nprocs <= 1:
+            for xi, eta in positions():
+                yield CGrid(*cmap.map(xi, eta))
+            return
+
+        # rows of all sizes share one pool, so the large grids do not
+        # hold up the small ones and every worker stays busy
+        blocks = [cmap._row_blocks(xi, eta, nprocs) for xi, eta in positions()]
+        pool = multiprocessing.Pool(nprocs, initializer=load_libgridgen,
+                                    initargs=(load_libgridgen()._name,))
+        try:
+            results = pool.imap(_map_block, [b for bs in blocks for b in bs])
+            for bs in blocks:
+                mapped = [next(results) for _ in bs]
+                x = numpy.concatenate([m[0] for m in mapped], axis=0)
+                y = numpy.concatenate([m[1] for m in mapped], axis=0)
+                yield CGrid(x, y)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def generate_async(self, executor=None):
+        """
+        Generate the grid in the background.
+
+        The call into gridgen-c releases the GIL, so the calling thread
+        is free while the grid is generated. Construct the grid with
+        ``autogen=False`` to use this.
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor, optional
+            Executor to run the generation. By default a single
+            background thread shared by all grids is used: gridgen-c
+            keeps global state, so generations in one process are run
+            one at a time. Pass a ``ProcessPoolExecutor`` to generate
+            several grids concurrently.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Resolves to the generated grid. With a thread executor that
+            is this object; with a process executor it is a generated
+            copy.
+
+        Examples
+        --------
+        >>> from concurrent.futures import as_completed
+        >>> grids = [pygridgen.Gridgen(x, y, beta, shape, autogen=False)
+        ...          for shape in [(50, 50), (100, 100), (200, 200)]]
+        >>> futures = [grid.generate_async() for grid in grids]
+        >>> for future in as_completed(futures):
+        ...     print(future.result().shape)
+
+        """
+
+        if executor is None:
+            executor = _default_executor()
+        # cleared here rather than in the executor, so that a cancel()
+        # made straight after this call is not lost
+        self._cancelled.clear()
+        return executor.submit(_generate, self)
+
+    def _set_nodes(self, x, y):
+        """ Mask invalid nodes and (re)initialize the CGrid. """
         if numpy.any(numpy.isnan(x)) or numpy.any(numpy.isnan(y)):
             x = numpy.ma.masked_where(numpy.isnan(x), x)
             y = numpy.ma.masked_where(numpy.isnan(y), y)
@@ -985,6 +2551,26 @@ class Gridgen(CGrid):
 
 
 
+# background thread used by Gridgen.generate_async
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _default_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=1)
+    return _executor
+
+
+def _generate(grid):
+    """ Generate ``grid`` and return it (in a worker). """
+    grid._run()
+    return grid
+
+
 def rho_to_vert(xr, yr, pm, pn, ang):  # pragma: no cover
     """ Possibly converts centroids to nodes """
     Mp, Lp = xr.shape
@@ -0,0 +1,51 @@
+import numpy.testing as nptest
+import pytest
+
+import pygridgen
+
+
+@pytest.fixture
+def specs():
+    x = [0.0, 1.0, 2.0, 1.0, 0.0]
+    y = [0.0, 0.0, 0.5, 1.0, 1.0]
+    beta = [1.0, 1.0, 0.0, 1.0, 1.0]
+    return [
+        dict(xbry=x, ybry=y, beta=beta, shape=(10, 5)),
+        dict(xbry=x, ybry=y, beta=[1.0] * 5, shape=(10, 5)),
+        dict(xbry=x, ybry=y, beta=beta, shape=(20, 8), ul_idx=1),
+    ]
+
+
+def test_generate_many(specs):
+    grids = pygridgen.generate_many(specs, processes=2)
+    assert len(grids) == len(specs)
+
+    for spec, grid in zip(specs, grids):
+        if spec['beta'] == [1.0] * 5:
+            assert isinstance(grid, ValueError)
+            continue
+
+        known = pygridgen.Gridgen(**spec)
+        assert grid.shape == known.shape
+        nptest.assert_array_almost_equal(grid.x, known.x)
+        nptest.assert_array_almost_equal(grid.y, known.y)
+        nptest.assert_array_almost_equal(grid.sigmas, known.sigmas)
+
+
+def test_generate_many_unpicklable(specs):
+    specs[1] = dict(specs[0], focus=lambda x, y: (x, y))
+    grids = pygridgen.generate_many(specs, processes=2)
+    assert isinstance(grids[1], Exception)
+    for n in (0, 2):
+        assert isinstance(grids[n], pygridgen.Gridgen)
+
+
+def test_generate_many_worker_exit(specs):
+    # a self-intersecting boundary makes gridgen-c exit
+    specs[1] = dict(xbry=[0.0, 1.0, 0.0, 1.0], ybry=[0.0, 1.0, 1.0, 0.0],
+                    beta=[1.0, 1.0, 1.0, 1.0], shape=(10, 5))
+    grids = pygridgen.generate_many(specs, processes=2)
+    assert isinstance(grids[1], RuntimeError)
+    for n in (0, 2):
+        known = pygridgen.Gridgen(**specs[n])
+        nptest.assert_array_almost_equal(grids[n].x, known.x)
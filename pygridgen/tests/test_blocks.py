@@ -0,0 +1,99 @@
+import numpy
+
+import numpy.testing as nptest
+import pytest
+
+import pygridgen
+
+
+@pytest.fixture
+def channel():
+    # a 3 x 1 rectangle with vertices every 0.5 along its long sides
+    xs = numpy.arange(0.0, 3.5, 0.5)
+    x = numpy.hstack([xs, xs[::-1]])
+    y = numpy.hstack([numpy.zeros(7), numpy.ones(7)])
+    beta = numpy.zeros(14)
+    beta[[0, 6, 7, 13]] = 1
+    return x, y, beta
+
+
+def test_split_boundary(channel):
+    x, y, beta = channel
+    blocks = pygridgen.split_boundary(x, y, beta, [(2, 11), (4, 9)])
+    assert len(blocks) == 3
+
+    known = [
+        [11, 12, 13, 0, 1, 2],
+        [2, 3, 4, 9, 10, 11],
+        [4, 5, 6, 7, 8, 9],
+    ]
+    for (xb, yb, bb, ul_idx), ring in zip(blocks, known):
+        nptest.assert_array_equal(xb, x[ring])
+        nptest.assert_array_equal(yb, y[ring])
+        assert bb.sum() == 4
+        assert ul_idx == len(ring) - 1
+
+    nptest.assert_array_equal(blocks[1][2], [1, 0, 1, 1, 0, 1])
+
+
+def test_split_boundary_flipped(channel):
+    x, y, beta = channel
+    blocks = pygridgen.split_boundary(x, y, beta, [(2, 11), (4, 9)])
+    flipped = pygridgen.split_boundary(x, y, beta, [(11, 2), (9, 4)])
+    reverse = pygridgen.split_boundary(x, y, beta, [(9, 4), (11, 2)])
+    for block, other, rev in zip(blocks, flipped, reverse[::-1]):
+        nptest.assert_array_equal(block[0], other[0])
+        assert sorted(block[0]) == sorted(rev[0])
+
+
+@pytest.mark.parametrize('cuts', [
+    [],
+    [(2, 9), (4, 11)],
+    [(2, 11), (4, 12)],
+    [(2, 3)],
+    [(0, 11)],
+])
+def test_split_boundary_bad(channel, cuts):
+    x, y, beta = channel
+    with pytest.raises(ValueError):
+        pygridgen.split_boundary(x, y, beta, cuts)
+
+
+def test_generate_blocks(channel):
+    x, y, beta = channel
+    grid = pygridgen.generate_blocks(x, y, beta, [(2, 11), (4, 9)], ny=5,
+                                     nx=[3, 5, 3], processes=2)
+    assert grid.x.shape == (5, 9)
+
+    # the nodes along the cuts
+    nptest.assert_array_almost_equal(grid.x[:, 2], 1.0)
+    nptest.assert_array_almost_equal(grid.x[:, 6], 2.0)
+    nptest.assert_array_almost_equal(grid.y[:, 0], numpy.linspace(0, 1, 5))
+
+
+def test_generate_blocks_match(channel):
+    # widen and bend the channel so that the blocks are not rectangles
+    x, y, beta = channel
+    y[7:] += 0.3 * x[7:] + 0.2 * numpy.sin(3 * x[7:])
+    cuts = [(2, 11), (4, 9)]
+
+    nodes = pygridgen.blocks._block_nodes(x, y, beta, cuts, ny=9,
+                                          nx=[5, 5, 5], processes=2)
+    for (xl, yl), (xr, yr) in zip(nodes[:-1], nodes[1:]):
+        # each block on its own misplaces them by up to 0.25
+        mismatch = numpy.hypot(xl[:, -1] - xr[:, 0], yl[:, -1] - yr[:, 0])
+        assert mismatch.max() < 0.01
+
+    grid = pygridgen.generate_blocks(x, y, beta, cuts, ny=9, nx=[5, 5, 5],
+                                     processes=2)
+    assert grid.x.shape == (9, 13)
+    nptest.assert_array_almost_equal(grid.x[:, 4], 1.0)
+    nptest.assert_array_almost_equal(grid.x[:, 8], 2.0)
+    assert numpy.all(numpy.diff(grid.y[:, 4]) > 0)
+    assert numpy.all(numpy.diff(grid.y[:, 8]) > 0)
+
+
+def test_generate_blocks_bad_nx(channel):
+    x, y, beta = channel
+    with pytest.raises(ValueError):
+        pygridgen.generate_blocks(x, y, beta, [(2, 11)], ny=5, nx=[3, 5, 3])
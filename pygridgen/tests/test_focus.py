@@ -177,3 +177,17 @@ def test_full_focus_called(full_focus, xy):
 
     nptest.assert_array_almost_equal(xf, known_focused_x, decimal=3)
     nptest.assert_array_almost_equal(yf, known_focused_y, decimal=3)
+
+
+def test_full_focus_vectors(full_focus, xy):
+    xf, yf = full_focus(*xy)
+    xv, yv = full_focus.vectors(10, 10)
+    nptest.assert_array_almost_equal(xv, xf[0])
+    nptest.assert_array_almost_equal(yv, yf[:, 0])
+
+
+def test_node_positions(full_focus, xy):
+    xf, yf = full_focus(*xy)
+    x, y = pygridgen.grid._node_positions((10, 10), full_focus)
+    nptest.assert_array_almost_equal(x, xf)
+    nptest.assert_array_almost_equal(y, yf)
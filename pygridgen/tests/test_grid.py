@@ -50,6 +50,19 @@ def grid_autogenFalse(options):
     return grid
 
 
+@pytest.fixture
+def many_vertices():
+    # a wavy square with 240 vertices, slow to solve for
+    nside = 60
+    t = numpy.arange(nside) / nside
+    wave = 0.05 * numpy.sin(2 * numpy.pi * t)
+    x = numpy.concatenate([t, 1 + wave, 1 - t, -wave])
+    y = numpy.concatenate([wave, t, 1 - wave, 1 - t])
+    beta = numpy.zeros(4 * nside)
+    beta[::nside] = 1
+    return x, y, beta
+
+
 @pytest.fixture
 def known_xy_basic():
     x = [0.0, 1.0, 2.0, 1.0, 0.0]
@@ -693,4 +706,421 @@ def test_mask_poylgon(grid_basic):
     nptest.assert_array_almost_equal(
         known_mask_rho,
         grid_basic.mask_rho
-    )
\ No newline at end of file
+    )
+
+def test_load_libgridgen_cached():
+    lib = pygridgen.load_libgridgen()
+    assert pygridgen.load_libgridgen() is lib
+
+
+def test_load_libgridgen_bad_path():
+    with pytest.raises(OSError):
+        pygridgen.load_libgridgen('/not/a/real/path/libgridgen.so')
+
+
+def test_load_libgridgen_path(monkeypatch, grid_basic, options):
+    monkeypatch.setattr(pygridgen.grid, '_libgridgen_path', None)
+    path = pygridgen.load_libgridgen()._name
+    lib = pygridgen.load_libgridgen(path)
+    assert pygridgen.load_libgridgen() is lib
+
+    x, y = known_xy_basic()['boundary']
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    assert grid._libgridgen is lib
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+
+
+def test_conformal_map(grid_basic):
+    cmap = grid_basic.conformal_map()
+    nptest.assert_array_almost_equal(cmap.sigmas, grid_basic.sigmas)
+
+    eta, xi = numpy.mgrid[0:1:10j, 0:1:5j]
+    x, y = cmap.map(xi, eta)
+    nptest.assert_array_almost_equal(x, grid_basic.x, decimal=6)
+    nptest.assert_array_almost_equal(y, grid_basic.y, decimal=6)
+
+    # scattered points keep their shape
+    x, y = cmap.map(xi.ravel()[:7], eta.ravel()[:7])
+    nptest.assert_array_almost_equal(x, grid_basic.x.ravel()[:7], decimal=6)
+    assert y.shape == (7,)
+
+    # nothing to map
+    x, y = cmap.map([], [])
+    assert x.shape == y.shape == (0,)
+
+
+def test_conformal_map_nprocs(grid_basic):
+    cmap = grid_basic.conformal_map()
+    known_x, known_y = cmap.map([0.5], [0.5])
+
+    # fewer points than processes
+    x, y = cmap.map([0.5], [0.5], nprocs=2)
+    nptest.assert_array_almost_equal(x, known_x)
+    nptest.assert_array_almost_equal(y, known_y)
+
+
+def test_conformal_map_out_of_range():
+    x = [0.0, 1.0, 2.0, 1.0, 0.0]
+    y = [0.0, 0.0, 0.5, 1.0, 1.0]
+    cmap = pygridgen.ConformalMap(x, y, [1, 1, 0, 1, 1], autosolve=False)
+    with pytest.raises(ValueError):
+        cmap.map([0.5, 1.5], [0.5, 0.5])
+
+
+def test_morton_order():
+    x = numpy.array([1.0, 0.0, 1.0, 0.0, 0.1])
+    y = numpy.array([1.0, 0.0, 0.0, 1.0, 0.1])
+    order = pygridgen.grid._morton_order(x, y)
+    nptest.assert_array_equal(order, [1, 4, 2, 3, 0])
+
+
+def test_nprocs(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'nprocs': 2})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x, decimal=6)
+    nptest.assert_array_almost_equal(grid.y, grid_basic.y, decimal=6)
+
+
+@pytest.mark.parametrize(('newton', 'known'), [
+    (True, 1),
+    (False, 0),
+    (1, 1),
+])
+def test_newton_flag(newton, known):
+    assert pygridgen.grid._newton_flag(newton) == known
+
+
+@pytest.mark.parametrize('newton', ['auto', 10, -1])
+def test_newton_flag_bad(newton):
+    with pytest.raises(ValueError):
+        pygridgen.grid._newton_flag(newton)
+
+
+def test_generate_async(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'autogen': False})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+
+    future = grid.generate_async()
+    assert future.result() is grid
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+    nptest.assert_array_almost_equal(grid.y, grid_basic.y)
+
+
+def test_pickle(grid_basic):
+    import pickle
+    grid = pickle.loads(pickle.dumps(grid_basic))
+    assert grid.sigma_cache is pygridgen.default_sigma_cache
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+    nptest.assert_array_almost_equal(grid.sigmas, grid_basic.sigmas)
+
+
+def test_threads(grid_basic, options):
+    from concurrent.futures import ThreadPoolExecutor
+
+    x, y = known_xy_basic()['boundary']
+    options.update({'sigma_cache': False})
+
+    def make(_):
+        return pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+
+    with ThreadPoolExecutor(4) as executor:
+        for grid in executor.map(make, range(8)):
+            nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+            nptest.assert_array_almost_equal(grid.y, grid_basic.y)
+
+
+def test_stats(grid_basic):
+    stats = grid_basic.stats
+    assert stats['nboundary'] == 5
+    assert stats['nquadrilaterals'] == grid_basic.nsigmas
+    assert stats['nodes_mapped'] == 50
+    assert stats['nodes_nan'] == 0
+    assert stats['time_solve'] is None
+    assert stats['time_total'] >= stats['time_map'] >= 0
+
+
+def test_timeout(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'timeout': 60})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    assert grid.timeout == 60
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+    nptest.assert_array_almost_equal(grid.y, grid_basic.y)
+
+
+def test_timeout_exceeded(many_vertices):
+    import multiprocessing
+    from timeit import default_timer
+
+    x, y, beta = many_vertices
+    grid = pygridgen.Gridgen(x, y, beta, (20, 20), timeout=0.5,
+                             sigma_cache=False, autogen=False)
+    start = default_timer()
+    with pytest.raises(TimeoutError):
+        grid.generate_grid()
+
+    # the solve takes far longer: the worker was stopped
+    assert default_timer() - start < 10
+    assert not multiprocessing.active_children()
+
+
+def test_timeout_lambda_focus(options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'timeout': 60, 'focus': lambda x, y: (x, y)})
+    with pytest.raises(ValueError):
+        pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+
+
+def test_cancel_idle(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'autogen': False})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+
+    # nothing to cancel yet, so the next generation is unaffected
+    grid.cancel()
+    grid.generate_grid()
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+
+
+def test_cancel_isolated(many_vertices):
+    import multiprocessing
+    import time
+    from concurrent.futures import CancelledError
+
+    x, y, beta = many_vertices
+    grid = pygridgen.Gridgen(x, y, beta, (20, 20), isolate=True,
+                             sigma_cache=False, autogen=False)
+    future = grid.generate_async()
+    time.sleep(0.5)
+    grid.cancel()
+
+    # the solve takes far longer: the worker was stopped
+    with pytest.raises(CancelledError):
+        future.result(timeout=10)
+    assert not multiprocessing.active_children()
+
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_sweep(grid_basic, options, nprocs):
+    x, y = known_xy_basic()['boundary']
+    options.update({'autogen': False})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+
+    grids = list(grid.sweep([(10, 5), (20, 10)], nprocs=nprocs))
+    assert grids[1].x.shape == (20, 10)
+    nptest.assert_array_almost_equal(grids[0].x, grid_basic.x, decimal=6)
+    nptest.assert_array_almost_equal(grids[0].y, grid_basic.y, decimal=6)
+
+
+def test_sweep_foci_length(options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'autogen': False})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    with pytest.raises(ValueError):
+        list(grid.sweep([(10, 5), (20, 10)], foci=[None]))
+
+
+def test_context_manager(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    with pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options) as grid:
+        assert grid._gn is not None
+
+    assert grid._gn is None
+    grid.close()
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+
+
+def test_free_gridnodes(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'free_gridnodes': True})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    assert grid._gn is None
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+    nptest.assert_array_almost_equal(grid.y, grid_basic.y)
+
+
+def test_reuse_sigmas_many_vertices(many_vertices):
+    # gridgen-c frees the sigmas it is seeded with, so every way of
+    # reusing them must hand over a copy it owns; a boundary with a few
+    # hundred vertices makes any mix-up crash rather than pass by luck
+    x, y, beta = many_vertices
+
+    options = dict(precision=1e-5, nnodes=4, nppe=1, verbose=False,
+                   sigma_cache=pygridgen.SigmaCache())
+    grid = pygridgen.Gridgen(x, y, beta, (20, 20), **options)
+    assert not grid.stats['sigmas_reused']
+    known_x, known_y = grid.x.copy(), grid.y.copy()
+
+    # the same grid again
+    grid.generate_grid()
+    assert grid.stats['sigmas_reused']
+    nptest.assert_array_almost_equal(grid.x, known_x)
+
+    # a new grid seeded from the cache
+    cached = pygridgen.Gridgen(x, y, beta, (20, 20), **options)
+    assert cached.stats['sigmas_reused']
+    nptest.assert_array_almost_equal(cached.x, known_x)
+    nptest.assert_array_almost_equal(cached.y, known_y)
+
+    # the conformal map of the solved grid
+    cmap = grid.conformal_map()
+    xi, eta = numpy.meshgrid(numpy.linspace(0, 1, 20), numpy.linspace(0, 1, 20))
+    xmap, ymap = cmap.map(xi, eta)
+    nptest.assert_array_almost_equal(xmap, known_x)
+    nptest.assert_array_almost_equal(ymap, known_y)
+    nptest.assert_array_almost_equal(cmap.sigmas, grid.sigmas)
+
+
+def test_rect(grid_basic, options):
+    # one entry per corner (non-zero beta), not per boundary vertex
+    assert grid_basic.xrect.shape == (4,)
+    assert grid_basic.yrect.shape == (4,)
+
+    x, y = known_xy_basic()['boundary']
+    options.update({'autogen': False})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    assert grid.xrect is None
+    grid.generate_grid()
+    nptest.assert_array_almost_equal(grid.xrect, grid_basic.xrect)
+    nptest.assert_array_almost_equal(grid.yrect, grid_basic.yrect)
+
+
+def test_normalize_boundary():
+    x = numpy.array([500.0, 700.0, 900.0, 700.0, 500.0])
+    y = numpy.array([100.0, 100.0, 200.0, 300.0, 300.0])
+    xn, yn, transform = pygridgen.grid._normalize_boundary(x, y)
+    nptest.assert_array_almost_equal(xn, [0.0, 0.5, 1.0, 0.5, 0.0])
+    nptest.assert_array_almost_equal(yn, [0.0, 0.0, 0.25, 0.5, 0.5])
+    assert transform == (500.0, 100.0, 400.0)
+
+    xd, yd = pygridgen.grid._denormalize(xn, yn, transform)
+    nptest.assert_array_almost_equal(xd, x)
+    nptest.assert_array_almost_equal(yd, y)
+
+
+def test_normalize_utm_scale(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    x0, y0, scale = 5.0e5, 4.0e6, 1.0e4
+    grid = pygridgen.Gridgen(numpy.asarray(x) * scale + x0,
+                             numpy.asarray(y) * scale + y0,
+                             [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    nptest.assert_array_almost_equal((grid.x - x0) / scale, grid_basic.x)
+    nptest.assert_array_almost_equal((grid.y - y0) / scale, grid_basic.y)
+
+
+def test_simplify_boundary():
+    # unit square with noisy, nearly collinear points along each side
+    side = numpy.linspace(0, 1, 11)[:-1]
+    noise = 1e-4 * numpy.sin(numpy.arange(10))
+    x = numpy.hstack([side, 1 + noise, 1 - side, noise])
+    y = numpy.hstack([noise, side, 1 + noise, 1 - side])
+    beta = numpy.zeros(40)
+    beta[[0, 10, 20, 30]] = 1
+
+    xs, ys, bs, ul_idx = pygridgen.simplify_boundary(x, y, beta, 1e-3, ul_idx=25)
+    nptest.assert_array_equal(bs, [1, 1, 1, 0, 1])
+    nptest.assert_array_almost_equal(xs, [0, 1, 1 + noise[0], 1 - side[5], noise[0]])
+    assert ul_idx == 3
+
+    xs, ys, bs, ul_idx = pygridgen.simplify_boundary(x, y, beta, 1e-6, ul_idx=25)
+    assert len(xs) == 40
+    assert ul_idx == 25
+
+
+def test_simplify_boundary_bad():
+    with pytest.raises(ValueError):
+        pygridgen.simplify_boundary([0, 1, 1, 0], [0, 0, 1], [1, 1, 1, 1], 0.1)
+
+    with pytest.raises(ValueError):
+        pygridgen.simplify_boundary([0, 1, 1, 0], [0, 0, 1, 1], [1, 1, 1, 1], -1)
+
+
+def test_simplify(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    xx = numpy.insert(x, 1, 0.5 * (x[0] + x[1]))
+    yy = numpy.insert(y, 1, 0.5 * (y[0] + y[1]))
+    options.update({'simplify': 1e-6})
+    grid = pygridgen.Gridgen(xx, yy, [1.0, 0.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    assert grid.stats['nboundary_removed'] == 1
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_continuation(grid_basic, options, nprocs):
+    x, y = known_xy_basic()['boundary']
+    options.update({'continuation': True, 'nprocs': nprocs, 'sigma_cache': False})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+    nptest.assert_array_almost_equal(grid.y, grid_basic.y)
+    nptest.assert_array_almost_equal(grid.sigmas, grid_basic.sigmas)
+
+
+def test_lagrange_weights():
+    t = numpy.array([0.0, 0.1, 0.33, 0.5, 0.95, 1.0])
+    weights, stencil, cell = pygridgen.grid._lagrange_weights(t, 6)
+    nptest.assert_array_equal(cell, [0, 0, 1, 2, 4, 4])
+    nptest.assert_array_equal(stencil.sum(axis=1), 4)
+
+    # cubics are reproduced exactly
+    lattice = numpy.linspace(0, 1, 6)
+    cubic = lambda s: 2 * s**3 - s**2 + 0.5 * s - 3
+    nptest.assert_array_almost_equal(weights.dot(cubic(lattice)), cubic(t))
+
+
+def test_map_interpolated():
+    x, y = known_xy_basic()['boundary']
+    cmap = pygridgen.ConformalMap(x, y, [1.0, 1.0, 0.0, 1.0, 1.0])
+    xi = numpy.linspace(0, 1, 41)
+    eta = numpy.linspace(0, 1, 61)**2
+
+    known_x, known_y = cmap.map(xi[None, :], eta[:, None])
+    result_x, result_y = cmap.map_interpolated(xi, eta, tolerance=1e-8, stride=4)
+    nptest.assert_array_almost_equal(result_x, known_x, decimal=7)
+    nptest.assert_array_almost_equal(result_y, known_y, decimal=7)
+
+    with pytest.raises(ValueError):
+        cmap.map_interpolated(xi[None, :], eta)
+
+
+def test_interpolate(grid_basic, options):
+    x, y = known_xy_basic()['boundary']
+    options.update({'interpolate': 1e-8})
+    grid = pygridgen.Gridgen(x, y, [1.0, 1.0, 0.0, 1.0, 1.0], (10, 5), **options)
+    nptest.assert_array_almost_equal(grid.x, grid_basic.x)
+    nptest.assert_array_almost_equal(grid.y, grid_basic.y)
+    assert grid.stats['nodes_interpolated'] == 0
+
+
+def test_interpolate_nodes(options):
+    x, y = known_xy_basic()['boundary']
+    beta = [1.0, 1.0, 0.0, 1.0, 1.0]
+    options.update({'sigma_cache': False})
+    known = pygridgen.Gridgen(x, y, beta, (81, 41), **options)
+
+    options.update({'interpolate': 1e-4})
+    grid = pygridgen.Gridgen(x, y, beta, (81, 41), **options)
+    assert 0 < grid.stats['nodes_interpolated'] < grid.x.size
+
+    # within the tolerance, relative to the size of the boundary (2)
+    assert numpy.nanmax(numpy.abs(grid.x - known.x)) < 2e-4
+    assert numpy.nanmax(numpy.abs(grid.y - known.y)) < 2e-4
+
+
+def test_map_many():
+    x, y = known_xy_basic()['boundary']
+    cmap = pygridgen.ConformalMap(x, y, [1.0, 1.0, 0.0, 1.0, 1.0])
+    xi = numpy.linspace(0, 1, 5)[None, :]
+    eta = numpy.linspace(0, 1, 3)[:, None]
+    points = [(xi, eta), (0.5, 0.5), ([0.1, 0.2], [0.3, 0.4])]
+
+    mapped = cmap.map_many(points)
+    assert len(mapped) == 3
+    for (xi, eta), (result_x, result_y) in zip(points, mapped):
+        known_x, known_y = cmap.map(xi, eta)
+        assert result_x.shape == known_x.shape
+        nptest.assert_array_almost_equal(result_x, known_x)
+        nptest.assert_array_almost_equal(result_y, known_y)
+
+    assert cmap.map_many([]) == []
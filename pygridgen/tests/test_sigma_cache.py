@@ -0,0 +1,75 @@
+import numpy.testing as nptest
+import pytest
+
+import pygridgen
+
+
+@pytest.fixture
+def boundary():
+    x = [0.0, 1.0, 2.0, 1.0, 0.0]
+    y = [0.0, 0.0, 0.5, 1.0, 1.0]
+    beta = [1.0, 1.0, 0.0, 1.0, 1.0]
+    return x, y, beta
+
+
+def test_key_depends_on_geometry(boundary):
+    x, y, beta = boundary
+    key = pygridgen.SigmaCache.key(x, y, beta, 0, True)
+    assert key == pygridgen.SigmaCache.key(x, y, beta, 0, True)
+    assert key != pygridgen.SigmaCache.key(x, y, beta, 1, True)
+    assert key != pygridgen.SigmaCache.key(x, y, beta, 0, False)
+    assert key != pygridgen.SigmaCache.key(y, x, beta, 0, True)
+
+
+def test_get_put():
+    cache = pygridgen.SigmaCache()
+    assert cache.get('a') is None
+
+    cache.put('a', [1.0, 2.0])
+    assert 'a' in cache
+    nptest.assert_array_equal(cache.get('a'), [1.0, 2.0])
+
+
+def test_lru_eviction():
+    cache = pygridgen.SigmaCache(maxsize=2)
+    cache.put('a', [1.0])
+    cache.put('b', [2.0])
+    cache.get('a')
+    cache.put('c', [3.0])
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    nptest.assert_array_equal(cache.get('a'), [1.0])
+    nptest.assert_array_equal(cache.get('c'), [3.0])
+
+
+def test_disk(tmpdir):
+    cachedir = str(tmpdir.join('sigmas'))
+    pygridgen.SigmaCache(cachedir=cachedir).put('a', [1.0, 2.0])
+
+    cache = pygridgen.SigmaCache(cachedir=cachedir)
+    assert 'a' in cache
+    nptest.assert_array_equal(cache.get('a'), [1.0, 2.0])
+
+    cache.clear()
+    assert cache.get('a') is None
+
+
+def test_disk_overwrite(tmpdir):
+    cachedir = str(tmpdir)
+    pygridgen.SigmaCache(cachedir=cachedir).put('a', [1.0, 2.0])
+    pygridgen.SigmaCache(cachedir=cachedir).put('a', [3.0, 4.0])
+
+    sigmas = pygridgen.SigmaCache(cachedir=cachedir).get('a')
+    nptest.assert_array_equal(sigmas, [3.0, 4.0])
+    assert not sigmas.flags.writeable
+
+
+def test_disk_eviction(tmpdir):
+    cachedir = str(tmpdir)
+    cache = pygridgen.SigmaCache(maxsize=1, cachedir=cachedir, disk_maxsize=2)
+    for n, key in enumerate('abc'):
+        cache.put(key, [float(n)])
+
+    assert len(tmpdir.listdir()) == 2
+    assert cache.get('c') is not None
@@ -16,6 +16,7 @@ Intended Audience :: Developers
 License :: "MIT"
 Operating System :: OS Independent
 Programming Language :: Python
+Programming Language :: Python :: 3
 Topic :: Scientific/Engineering
 Topic :: Software Development :: Libraries :: Python Modules
 """
@@ -33,7 +34,8 @@ setup(
     url="http://github.com/hetland/pygridgen",
     packages=find_packages(exclude=[]),
     license="MIT",
-    platforms="Python 2.7, 3.4, 3.5 and later.",
+    platforms="Python 3.4, 3.5 and later.",
+    python_requires=">=3.4",
     ext_package='pygridgen',
     classifiers=classifiers.split("\n"),
     install_requires=['numpy', 'matplotlib'],